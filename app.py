@@ -1,23 +1,130 @@
-import matplotlib
-matplotlib.use("Agg")
+import time
+
+# Start of the app import, for the import-to-ready time reported by create_app
+import_started = time.perf_counter()
 
 import dash
-from dash import dcc, html, Input, Output, State
+from dash import dcc, html, Input, Output, State, ClientsideFunction
 from dash.dependencies import ALL
-import dash_bootstrap_components as dbc
-import pandas as pd
-import matplotlib.pyplot as plt
+from flask import abort, make_response, request
 import os
-import io
 import base64
+import gzip
 import json
+import math
+import threading
+import uuid
+from urllib.parse import quote
+
+import metrics
+from catalog import Catalog, header_cohorts
+from gene_tables import GeneTableCache, gene_exists
+from render_cache import RenderCache, render_key
+from render_pool import RenderPool, RenderQueueFull, RenderTimeout
+from render_static import StaticPlots
+from search_index import SearchIndex
+from upload_store import UploadError, UploadStore, is_upload_handle
+from variant_index import VariantIndexCache
 
 
 # Path to the output directory
 data_dir = "data"
 
-# Specify the datasets that will be included in the app
+# Memory budget for parsed gene tables shared between callbacks (in bytes)
+gene_cache_max_bytes = 256 * 1024 * 1024
+gene_cache = GeneTableCache(gene_cache_max_bytes)
+
+# AA-position indexes of the most recently queried genes, used by /api/variants
+variant_index_cache = VariantIndexCache(64)
+
+# Default and maximum number of variants per /api/variants page
+api_page_size = 100
+api_max_page_size = 1000
+
+# Maximum number of variants listed for a search
+search_result_limit = 50
+
+# Rendered plots are cached in memory and as content-addressed PNGs on disk. Beyond
+# render_cache_disk_max_bytes the least recently used files are deleted.
+# Set render_cache_dir to None to keep the cache in memory only.
+render_cache_max_bytes = 128 * 1024 * 1024
+render_cache_dir = os.path.join("cache", "plots")
+render_cache_disk_max_bytes = 1024 * 1024 * 1024
+render_cache = RenderCache(render_cache_max_bytes, render_cache_dir, disk_max_bytes=render_cache_disk_max_bytes)
+
+# Plots are rendered on a bounded pool of worker threads. Requests beyond the workers
+# wait in a queue of at most render_queue_depth; when it is full the client is asked
+# to retry. A render taking longer than render_timeout seconds is reported as timed out.
+render_workers = 4
+render_queue_depth = 16
+render_timeout = 30
+render_pool = RenderPool(render_workers, render_queue_depth)
+
+# Plots pre-rendered by render_static.py (python render_static.py --out static_plots) are
+# read from static_plot_dir instead of being rendered. If the directory is published on a
+# static host or CDN, set static_plot_url to its base URL and browsers load those plots
+# from there directly.
+static_plot_dir = "static_plots"
+static_plot_url = None
+static_plots = StaticPlots(static_plot_dir)
+
+# Variants in the same exon at most this many amino acids apart are drawn as one cluster
+cluster_distance = 10
+
+# Level of detail of the PNG plots: when the clusters with carriers visible in the
+# selected AA window hold more than detail_max_variants variants (one dot each), carriers
+# are drawn as overview_bins density bars and only the overview_labels variants with most
+# carriers are labelled, so render time stays about the same for long proteins and
+# large uploads
+detail_max_variants = 200
+overview_bins = 200
+overview_labels = 10
+
+# Drawing settings passed to plotting.build_figure; they are part of the render cache key
+plot_options = {
+    "cluster_distance": cluster_distance,
+    "detail_max_variants": detail_max_variants,
+    "overview_bins": overview_bins,
+    "overview_labels": overview_labels,
+}
+
+# "interactive" draws the plot in the browser from the clustered variant data,
+# "image" renders a 300 dpi matplotlib PNG on the server (also used for export)
+default_render_mode = "interactive"
+
+# Datasets are discovered from the directories (and .arrow stores) in data_dir;
+# those listed here are shown first, in this order. Directories in excluded_datasets
+# (such as data/custom, where older versions saved uploads) are ignored.
 datasets = ["tangl", "redlat"]
+excluded_datasets = ["custom"]
+
+# Name of the dataset button where users can upload their own gene file (None to disable).
+# Uploads are parsed once and kept in memory for the browser session that uploaded them;
+# least recently used uploads are dropped beyond upload_store_max_bytes and unused ones
+# expire after upload_ttl seconds.
+upload_dataset = "custom"
+upload_max_file_bytes = 20 * 1024 * 1024
+upload_store_max_bytes = 256 * 1024 * 1024
+upload_ttl = 60 * 60
+upload_store = UploadStore(upload_store_max_bytes, upload_ttl, upload_max_file_bytes)
+# Plots of uploads are cached in memory only, never in render_cache_dir
+upload_render_cache_max_bytes = 32 * 1024 * 1024
+upload_render_cache = RenderCache(upload_render_cache_max_bytes)
+
+# Per-phase timings, payload sizes and cache statistics are served in the Prometheus
+# format at /metrics. With debug_timing, every response also carries a Server-Timing
+# header with the time spent in each phase (shown in the browser's developer tools)
+# and a timing line is logged for each instrumented request.
+debug_timing = False
+
+# With warm_up_on_start, create_app builds the search index, parses every gene file and
+# renders one plot before the app serves requests, so that no user waits for parsing or
+# for matplotlib to load. Run gunicorn with --preload to do this once and share the result
+# between the workers (copy-on-write).
+warm_up_on_start = False
+
+# How often (in seconds) the catalog of datasets and gene files is refreshed from disk
+catalog_poll_interval = 10
 
 # Define the cohort categories and their labels
 cohort_categories = [
@@ -95,77 +202,206 @@ legend_map = {
     }
 }
 
-# Initialize the Dash app
+# Initialize the Dash app (the Bootstrap theme is added by create_app, which imports
+# dash_bootstrap_components)
 app = dash.Dash(__name__, 
-                suppress_callback_exceptions=True, 
-                external_stylesheets=[dbc.themes.MINTY])
-server = app.server
-
-# Layout of the app
-app.layout = html.Div([
-    html.Div([
-        html.H1("Variant Visualizer", 
-                style={"marginBottom": "10px", "fontWeight": "bold"}),
-        
-        html.H5("Explore allelic counts in neurodegenerative disease cohorts", 
-                style={"marginBottom": "30px","color": "#555"}), 
-        
-        html.H5("To use this app click on a cohort, choose a category and select a gene from the dropdown", 
-                style={"color": "#555", "fontSize": "14px", "fontwidth": "normal"})
-    ], style={"textAlign": "center", "marginTop": "30px", "marginBottom": "20px"}
-    ),
-
-
-    html.Div(
-        [dbc.Button(ds.upper(),
-                    id={"type": "dataset-button", "index": ds},
-                    n_clicks=0,
-                    color="dark",
-                    className="me-2 mb-2") for ds in datasets],
-        className="d-flex flex-wrap mb-3 justify-content-center"
-    ),
+                suppress_callback_exceptions=True)
 
-    dcc.Store(id="selected-dataset"),
-    dcc.Store(id="selected-cohort"),
-    html.Div(id="cohort-button-container"),
-    html.Div(id="upload-container"),
-    dcc.Store(id="custom-file-store"),
+# Gene files, variant counts and cohorts of every dataset (scanned by create_app and kept up
+# to date in the background)
+catalog = None
 
-    dcc.Dropdown(
-        id="file-dropdown",
-        placeholder="Select a gene"
-    ),
+# Variants of all datasets by protein change, AA position and gene, updated with the catalog
+search_index = SearchIndex()
 
-    html.Img(id="plot-image", style={'width': '100%', 'height': 'auto'}),
+# Seconds spent in each startup step, reported by create_app and on /metrics
+startup_times = {}
+startup_lock = threading.Lock()
+background_pid = None
 
-    html.Div([
-        html.P(
-            "The Variant visualizer was developed by Dylan Lu, & Juliana Acosta-Uribe (2025) for Tau Bioinformatics; part of the Tau Consortium data collaboration initiative",
-            style={"fontWeight": "bold", "marginBottom": "0"}
+def create_app(warm_up=None):
+    # Scan the data, build the search index, warm up if warm_up (default: warm_up_on_start)
+    # and return the Dash app.
+    # Only the first call does any work. gunicorn app:server calls it through __getattr__ at
+    # the end of this file, so it runs once per worker, or once in total with --preload.
+    global catalog
+    with startup_lock:
+        if catalog is not None:
+            return app
+        import dash_bootstrap_components as dbc
+        # pandas is loaded before any request is served: plotly's JSON encoder uses it
+        # whenever it is in sys.modules, and would find it half-imported while another
+        # thread is importing it
+        import pandas  # noqa: F401
+        started = time.perf_counter()
+        startup_times["import"] = started - import_started
+        app.config.external_stylesheets = [dbc.themes.MINTY]
+        new_catalog = Catalog(data_dir, order=datasets, exclude=excluded_datasets)
+        new_catalog.add_listener(search_index.update)
+        catalog = new_catalog
+        startup_times["catalog"] = time.perf_counter() - started
+        # Built before the first request, so that searches never see a partial index
+        start = time.perf_counter()
+        search_index.update(catalog)
+        startup_times["search_index"] = time.perf_counter() - start
+        if warm_up_on_start if warm_up is None else warm_up:
+            startup_times.update(warm_up_app())
+        startup_times["ready"] = time.perf_counter() - import_started
+        app.server.logger.warning(
+            "Ready %.2fs after import (%s)", startup_times["ready"],
+            ", ".join(f"{step} {seconds:.2f}s" for step, seconds in startup_times.items() if step != "ready")
+        )
+    return app
+
+def warm_up_app():
+    # Parse every gene file into gene_cache and render one plot (loading matplotlib and its
+    # fonts). Runs in the calling thread without the render pool, so no threads exist yet
+    # when a preloading server forks its workers. Returns the seconds spent in each step.
+    times = {}
+    start = time.perf_counter()
+    first = None
+    for dataset in catalog.datasets():
+        for gene in catalog.genes(dataset):
+            file_path = os.path.join(data_dir, dataset, gene)
+            if gene_exists(file_path):
+                gene_cache.get(file_path)
+                entry = catalog.gene(dataset, gene)
+                if first is None and entry is not None and entry.cohorts:
+                    first = (file_path, dataset, entry.cohorts[0])
+    times["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if first is not None:
+        file_path, dataset, cohort = first
+        table = gene_cache.get(file_path)
+        key = table_plot_key(table, dataset, cohort)
+        if render_cache.get(key) is None:
+            png, _ = render_plot_png(table.variants, table.exon_ranges, cohort, *plot_text(dataset, cohort))
+            render_cache.put(key, png)
+    times["render"] = time.perf_counter() - start
+    return times
+
+@app.server.before_request
+def start_background_work():
+    # Threads do not survive fork, so every worker process starts its own catalog polling
+    # on its first request (each refresh also updates the search index). A server that was given app.server without
+    # going through create_app (e.g. from app import app) sets the app up here
+    global background_pid
+    if background_pid == os.getpid():
+        return
+    if catalog is None:
+        create_app()
+    with startup_lock:
+        if background_pid == os.getpid():
+            return
+        catalog.start(catalog_poll_interval)
+        background_pid = os.getpid()
+
+# Layout of the app, built on every page load so that datasets added to data/
+# show up without restarting the app
+def serve_layout():
+    import dash_bootstrap_components as dbc
+    if catalog is None:
+        create_app()
+    return html.Div([
+        html.Div([
+            html.H1("Variant Visualizer", 
+                    style={"marginBottom": "10px", "fontWeight": "bold"}),
+        
+            html.H5("Explore allelic counts in neurodegenerative disease cohorts", 
+                    style={"marginBottom": "30px","color": "#555"}), 
+        
+            html.H5("To use this app click on a cohort, choose a category and select a gene from the dropdown", 
+                    style={"color": "#555", "fontSize": "14px", "fontwidth": "normal"})
+        ], style={"textAlign": "center", "marginTop": "30px", "marginBottom": "20px"}
         ),
-        html.P(
-            "You can find the code for the variant visualizer in: https://github.com/TauConsortium/variant-visualizer ",
-            style={"fontWeight": "bold", "marginTop": "0", "marginBottom": "10px"}
+
+        html.Div([
+            dcc.Input(
+                id="search-input",
+                type="search",
+                debounce=True,
+                placeholder="Search a variant, position or gene in all cohorts (e.g. PSEN1 E280A)",
+                className="form-control"
+            ),
+            html.Div(id="search-results", style={"fontSize": "14px", "marginTop": "5px"}),
+        ], style={"maxWidth": "700px", "margin": "0 auto 20px auto"}),
+
+        html.Div(
+            [dbc.Button(ds.upper(),
+                        id={"type": "dataset-button", "index": ds},
+                        n_clicks=0,
+                        color="dark",
+                        className="me-2 mb-2") for ds in catalog.datasets() + ([upload_dataset] if upload_dataset else [])],
+            className="d-flex flex-wrap mb-3 justify-content-center"
         ),
-        html.P(
-            "If you use any of our data, please cite us:",
-            style={"fontWeight": "bold", "marginBottom": "3px"}
+
+        dcc.Store(id="selected-dataset"),
+        dcc.Store(id="selected-cohort"),
+        html.Div(id="cohort-button-container"),
+        html.Div(id="upload-container"),
+        dcc.Store(id="custom-file-store"),
+        # Identifies this page's uploads in upload_store
+        dcc.Store(id="session-id", data=uuid.uuid4().hex),
+
+        dcc.Dropdown(
+            id="file-dropdown",
+            placeholder="Select a gene"
         ),
-        html.P(
-            "TANGL: Acosta-Uribe, J., Aguillón, D., Cochran, J. N., Giraldo, M., Madrigal, L., Killingsworth, B. W., ... & Kosik, K. S. (2022). A neurodegenerative disease landscape of rare mutations in Colombia due to founder effects. Genome Medicine, 14(1), 27.",
-            style={"marginTop": "0", "marginBottom": "3px"}   
+
+        dcc.RadioItems(
+            id="render-mode",
+            options=[
+                {"label": " Interactive", "value": "interactive"},
+                {"label": " Image (PNG export)", "value": "image"},
+            ],
+            value=default_render_mode,
+            inline=True,
+            labelStyle={"marginRight": "15px"},
+            style={"textAlign": "center", "marginTop": "10px"}
         ),
-        html.P(
-            "ReDLat: Acosta-Uribe, J., Piña-Escudero, S. D., Cochran, J. N., Taylor, J. W., Castruita, P. A., Jonson, C., ... Kosik, K. S. & Yokoyama, J. S. (2024). Genetic Contributions to Alzheimer’s Disease and Frontotemporal Dementia in Admixed Latin American Populations. medRxiv.",
-            style={"marginTop": "0"}
+        dcc.Store(id="plot-data"),
+
+        html.Div(id="plot-status"),
+        html.Div(
+            dcc.RangeSlider(id="aa-window", min=0, max=1, step=1, marks=None, allowCross=False,
+                            tooltip={"placement": "bottom"}),
+            id="aa-window-container", style={"display": "none"}
         ),
-    ], style={"marginTop": "40px", "padding": "5px", "borderTop": "1px solid #ccc", "fontSize": "14px"}),
+        dcc.Graph(id="plot-graph", config={"displaylogo": False}, style={"display": "none"}),
+        html.Img(id="plot-image", style={'width': '100%', 'height': 'auto'}),
+
+        html.Div([
+            html.P(
+                "The Variant visualizer was developed by Dylan Lu, & Juliana Acosta-Uribe (2025) for Tau Bioinformatics; part of the Tau Consortium data collaboration initiative",
+                style={"fontWeight": "bold", "marginBottom": "0"}
+            ),
+            html.P(
+                "You can find the code for the variant visualizer in: https://github.com/TauConsortium/variant-visualizer ",
+                style={"fontWeight": "bold", "marginTop": "0", "marginBottom": "10px"}
+            ),
+            html.P(
+                "If you use any of our data, please cite us:",
+                style={"fontWeight": "bold", "marginBottom": "3px"}
+            ),
+            html.P(
+                "TANGL: Acosta-Uribe, J., Aguillón, D., Cochran, J. N., Giraldo, M., Madrigal, L., Killingsworth, B. W., ... & Kosik, K. S. (2022). A neurodegenerative disease landscape of rare mutations in Colombia due to founder effects. Genome Medicine, 14(1), 27.",
+                style={"marginTop": "0", "marginBottom": "3px"}   
+            ),
+            html.P(
+                "ReDLat: Acosta-Uribe, J., Piña-Escudero, S. D., Cochran, J. N., Taylor, J. W., Castruita, P. A., Jonson, C., ... Kosik, K. S. & Yokoyama, J. S. (2024). Genetic Contributions to Alzheimer’s Disease and Frontotemporal Dementia in Admixed Latin American Populations. medRxiv.",
+                style={"marginTop": "0"}
+            ),
+        ], style={"marginTop": "40px", "padding": "5px", "borderTop": "1px solid #ccc", "fontSize": "14px"}),
+
+        html.Img(
+            src="/assets/logo.png",
+            style={"display": "block", "margin": "40px auto 0 auto", "height": "60px"}
+        )
+    ])
 
-    html.Img(
-        src="/assets/logo.png",
-        style={"display": "block", "margin": "40px auto 0 auto", "height": "60px"}
-    )
-])
+
+app.layout = serve_layout
 
 @app.callback(
     Output("selected-dataset", "data"),
@@ -184,18 +420,25 @@ def store_selected_dataset(n_clicks_list):
 @app.callback(
     Output("cohort-button-container", "children"),
     Input("selected-dataset", "data"),
+    Input("custom-file-store", "data"),
     prevent_initial_call=True
 )
-def update_cohort_buttons(selected_dataset):
+def update_cohort_buttons(selected_dataset, uploaded):
+    import dash_bootstrap_components as dbc
     if not selected_dataset:
         return dash.no_update
-    if selected_dataset == "redlat":
-        allowed = {"all", "ad", "ftd", "aao", "healthy"}
-    else:  # tangl
-        allowed = {"all", "ad", "eod", "ftld-mnd", "aao", "healthy"}
+    # Cohorts with counts in the dataset's gene files (or the uploaded file), known
+    # categories first in their usual order, then any other cohort found in the headers
+    if selected_dataset == upload_dataset:
+        available = uploaded["cohorts"] if uploaded else ()
+    else:
+        available = catalog.cohorts(selected_dataset)
+    labels = dict(cohort_categories)
+    cohorts = [val for val, _ in cohort_categories if val in available]
+    cohorts += [val for val in available if val not in labels]
     return html.Div(
-        [dbc.Button(label, id={"type": "cohort-button", "index": val}, n_clicks=0, color="warning", className="me-2 mb-2")
-         for val, label in cohort_categories if val in allowed],
+        [dbc.Button(labels.get(val, val), id={"type": "cohort-button", "index": val}, n_clicks=0, color="warning", className="me-2 mb-2")
+         for val in cohorts],
         className="d-flex flex-wrap mb-3 justify-content-center"
     )
 
@@ -219,9 +462,9 @@ def store_selected_cohort(n_clicks_list, selected_dataset):
     Input("selected-dataset", "data")
 )
 def toggle_upload(selected_dataset):
-    if selected_dataset != "custom":
+    if not upload_dataset or selected_dataset != upload_dataset:
         return []
-    return dcc.Upload(
+    return [dcc.Upload(
         id="upload-data",
         children=html.Div(["Drag and Drop or ", html.A("Select a .txt File")]),
         style={
@@ -235,146 +478,557 @@ def toggle_upload(selected_dataset):
             "marginBottom": "10px",
         },
         multiple=False,
-    )
+        max_size=upload_max_file_bytes,
+    ), html.Div(id="upload-status")]
 
 @app.callback(
     Output("custom-file-store", "data"),
+    Output("upload-status", "children"),
     Input("upload-data", "contents"),
     State("upload-data", "filename"),
+    State("session-id", "data"),
     prevent_initial_call=True,
 )
-def store_uploaded_file(content, filename):
+@metrics.instrument("store_uploaded_file")
+def store_uploaded_file(content, filename, session_id):
+    import dash_bootstrap_components as dbc
     if content is None:
-        return None
-    content_type, content_string = content.split(",")
-    decoded = base64.b64decode(content_string)
-    os.makedirs(os.path.join(data_dir, "custom"), exist_ok=True)
-    save_path = os.path.join("custom", filename)
-    with open(os.path.join(data_dir, save_path), "wb") as f:
-        f.write(decoded)
-    return save_path
+        return None, None
+    # Parsed once into the session's upload store; the page only keeps the handle
+    try:
+        upload = upload_store.add(session_id, content, filename)
+    except UploadError as e:
+        return dash.no_update, dbc.Alert(str(e), color="danger")
+    return {"handle": upload.handle, "name": upload.name, "cohorts": list(upload.cohorts)}, None
 
 @app.callback(
     Output("file-dropdown", "options"),
     Input("selected-dataset", "data"),
     Input("custom-file-store", "data")
 )
-def update_file_options(selected_dataset, uploaded_path):
+@metrics.instrument("update_file_options")
+def update_file_options(selected_dataset, uploaded):
     options = []
     if selected_dataset:
-        folder_path = os.path.join(data_dir, selected_dataset)
-        if os.path.exists(folder_path):
-            files = [f for f in os.listdir(folder_path) if not f.startswith(".")]
-            files = sorted(files)  # Sort files alphabetically
-            options = [{"label": f, "value": os.path.join(selected_dataset, f)} for f in files]
-    if selected_dataset == "custom" and uploaded_path:
-        options.append({"label": f"[Uploaded] {os.path.basename(uploaded_path)}", "value": uploaded_path})
+        # Gene files from the dataset folder and its consolidated store, sorted alphabetically
+        files = catalog.genes(selected_dataset)
+        options = [{"label": f, "value": os.path.join(selected_dataset, f)} for f in files]
+    if selected_dataset == upload_dataset and uploaded:
+        options.append({"label": f"[Uploaded] {uploaded['name']}", "value": uploaded["handle"]})
     return options
 
 @app.callback(
     Output("plot-image", "src"),
+    Output("plot-status", "children"),
     Input("file-dropdown", "value"),
     Input("selected-dataset", "data"),
     Input("selected-cohort", "data"),
-    State("file-dropdown", "options")
+    Input("render-mode", "value"),
+    Input("aa-window", "value"),
+    State("file-dropdown", "options"),
+    State("session-id", "data")
 )
-def update_plot(selected_file, selected_dataset, selected_cohort, dropdown_options):
-    if not selected_file or not selected_dataset or not selected_cohort:
-        return ""
+@metrics.instrument("update_plot")
+def update_plot(selected_file, selected_dataset, selected_cohort, render_mode, window, dropdown_options, session_id):
+    import dash_bootstrap_components as dbc
+    from dash import callback_context
+    if not selected_file or not selected_dataset or not selected_cohort or render_mode != "image":
+        return "", None
+    # A new gene resets the AA window (update_aa_window), which triggers this callback again
+    if window and "file-dropdown.value" in [t["prop_id"] for t in callback_context.triggered]:
+        window = None
+    if is_upload_handle(selected_file):
+        # Uploads are private to the session, so they are sent inline rather than by URL
+        upload = upload_store.get(session_id, selected_file)
+        if upload is None:
+            return "", dbc.Alert("The uploaded file has expired. Please upload it again.", color="warning")
+        aa_window = slider_aa_window(upload.table, window)
+        try:
+            png, _ = render_table_png(upload.table, selected_dataset, selected_cohort, aa_window, upload=True)
+        except RenderQueueFull:
+            return "", dbc.Alert("The server is busy rendering other plots. Please try again in a few seconds.", color="warning")
+        except RenderTimeout:
+            return "", dbc.Alert("The plot took too long to render. Please try again later.", color="warning")
+        with metrics.phase("base64"):
+            src = "data:image/png;base64," + base64.b64encode(png).decode()
+        return src, None
     file_path = os.path.join(data_dir, selected_file)
-    if not os.path.exists(file_path):
-        return ""
-    variants = pd.read_csv(file_path, sep="\t")
-    variants["AA"] = pd.to_numeric(variants["AA"], errors="coerce")
-    variants = variants.dropna(subset=["AA"])
-    variants = variants.sort_values("AA").reset_index(drop=True)
-    exon_ranges = variants.groupby("exon")["AA"].agg(["min", "max"]).reset_index()
-    fig, ax = plt.subplots(figsize=(12, 4), dpi=100)
-    grouped_variants = []
-    cluster = [variants.iloc[0]] if not variants.empty else []
-    cluster_distance = 10
-    for i in range(1, len(variants)):
-        current = variants.iloc[i]
-        previous = cluster[-1]
-        same_exon = current["exon"] == previous["exon"]
-        close_by = abs(current["AA"] - previous["AA"]) <= cluster_distance
-        if same_exon and close_by:
-            cluster.append(current)
-        else:
-            grouped_variants.append(cluster)
-            cluster = [current]
-    if cluster:
-        grouped_variants.append(cluster)
-    for cluster in grouped_variants:
-        het_col = f"{selected_cohort}.Het"
-        hom_col = f"{selected_cohort}.Hom_A1"
-        if not any((v.get(hom_col, 0) + v.get(het_col, 0)) > 0 for v in cluster):
-            continue
-        x = sum(v["AA"] for v in cluster) / len(cluster)
-        base_y = -0.07
-        y = -0.03
-        color = "black"
-        ax.vlines(x, base_y, y, color=color, linewidth=1)
-        for i, v in enumerate(cluster):
-            offset = -i * 0.005
-            ax.scatter(x, y + offset, color=color, s=10, zorder=3)
-        label = "\n".join([
-            f"{v['variant']} ({v.get(hom_col, 0)} / {v.get(het_col, 0)})"
-            for v in cluster
-            if (v.get(hom_col, 0) + v.get(het_col, 0)) > 0
-        ])
-        ax.text(x, y + len(cluster) * 0.003 + 0.01, label, rotation=90, ha="center", fontsize=8, color=color)
-    exon_y = -0.08
-    exon_height = 0.005
-    ax.fill_between(
-        [1, variants["AA"].max() + 50],
-        exon_y - exon_height / 2,
-        exon_y + exon_height / 2,
-        color="lightgray",
-        zorder=0
-    )
-    colors = plt.cm.Paired.colors
-    exon_legend = {}
-    for i, (_, exon) in enumerate(exon_ranges.iterrows()):
-        exon_color = colors[i % len(colors)]
-        min_width = 5
-        exon_start, exon_end = exon["min"], exon["max"]
-        if exon_end - exon_start < min_width:
-            exon_start -= min_width / 2
-            exon_end += min_width / 2
-        ax.hlines(exon_y, exon_start, exon_end, colors=exon_color, linewidth=6, label=exon["exon"], zorder=1)
-        exon_legend[exon["exon"]] = exon_color
-    ax.set_xlim(0, variants["AA"].max() + 50)
-    ax.set_ylim(-0.1, 0.25)
-    ax.set_xlabel("Amino Acid Position", fontsize=12)
-    y_label = (
-        "Carriers (Homozygous/Heterozygous)"
-    )
-    ax.set_ylabel(y_label, fontsize=8)
-    ax.set_yticks([])
-    ax.spines["top"].set_visible(False)
-    ax.spines["right"].set_visible(False)
-    ax.spines["left"].set_visible(False)
-    handles = [plt.Line2D([0], [0], color=color, linewidth=5, label=exon) for exon, color in exon_legend.items()]
-    ax.legend(handles=handles, title="Exons", loc="center left", bbox_to_anchor=(1.01, 0.5), fontsize=8)
+    dataset, gene = os.path.split(selected_file)
+    if not plot_exists(dataset, gene, selected_cohort):
+        return "", None
+    aa_window = slider_aa_window(gene_cache.get(file_path), window) if window else None
+    if static_plot_url and aa_window is None:
+        static_path = static_plots.path(plot_key(file_path, dataset, selected_cohort))
+        if static_path is not None:
+            return f"{static_plot_url.rstrip('/')}/{static_path}", None
+    # Render (or find in the cache) before handing out the URL, so that a busy server
+    # or a slow render is reported here instead of showing up as a broken image
+    try:
+        _, key = get_plot_png(file_path, dataset, selected_cohort, aa_window)
+    except RenderQueueFull:
+        return "", dbc.Alert("The server is busy rendering other plots. Please try again in a few seconds.", color="warning")
+    except RenderTimeout:
+        return "", dbc.Alert("The plot took too long to render. Please try again later.", color="warning")
+    # The image itself is served by serve_plot; the version parameter changes with
+    # the file contents so browsers and proxies can cache each URL indefinitely
+    url = f"/plot/{quote(dataset, safe='')}/{quote(gene, safe='')}/{quote(selected_cohort, safe='')}.png?v={key}"
+    if aa_window is not None:
+        url += f"&start={aa_window[0]:g}&end={aa_window[1]:g}"
+    return url, None
+
+@app.callback(
+    Output("aa-window", "max"),
+    Output("aa-window", "value"),
+    Input("file-dropdown", "value"),
+    State("session-id", "data")
+)
+def update_aa_window(selected_file, session_id):
+    # The AA window of the image starts out as the whole protein
+    table = selected_table(selected_file, session_id) if selected_file else None
+    xmax = aa_window_max(table) if table is not None else 1
+    return xmax, [0, xmax]
+
+def aa_window_max(table):
+    # Right end of the AA window slider: the last variant plus a margin
+    if table.variants.empty:
+        return 1
+    return int(math.ceil(table.variants["AA"].max() + 50))
+
+def parse_aa_window(start, end, xmax):
+    # AA window rounded to whole positions, like the slider, and clamped to [0, xmax], so
+    # that the render keys of a gene are bounded; raises ValueError for a bound that is
+    # not a finite number or an empty window
+    start, end = float(start), float(end)
+    if not (math.isfinite(start) and math.isfinite(end)):
+        raise ValueError("start and end must be numbers")
+    start, end = (min(max(round(x), 0), xmax) for x in (start, end))
+    if start >= end:
+        raise ValueError("start must be less than end")
+    return float(start), float(end)
+
+def slider_aa_window(table, window):
+    # AA window of a slider value, clamped to the slider range of the table (computed here,
+    # not taken from the client); None for the whole protein or an invalid value
+    if not window:
+        return None
+    xmax = aa_window_max(table)
+    try:
+        aa_window = parse_aa_window(window[0], window[1], xmax)
+    except (IndexError, TypeError, ValueError):
+        return None
+    return None if aa_window == (0, xmax) else aa_window
+
+def selected_table(selected_file, session_id, cohort=None):
+    # GeneTable of a gene file or upload selected in the dropdown (with counts for cohort,
+    # if given), or None if it is gone. The value comes from the client, so gene files
+    # must be in the catalog
+    if is_upload_handle(selected_file):
+        upload = upload_store.get(session_id, selected_file)
+        return upload.table if upload else None
+    dataset, gene = os.path.split(selected_file)
+    if not (plot_exists(dataset, gene, cohort) if cohort is not None else gene_listed(dataset, gene)):
+        return None
+    return gene_cache.get(os.path.join(data_dir, selected_file))
+
+def gene_listed(dataset, gene):
+    # A gene file of a catalogued dataset (excluded directories, such as the old upload
+    # folder, are not in the catalog)
+    if dataset not in catalog.datasets() or catalog.gene(dataset, gene) is None:
+        return False
+    return gene_exists(os.path.join(data_dir, dataset, gene))
+
+def plot_exists(dataset, gene, cohort):
+    # A catalogued gene file with counts for cohort
+    return gene_listed(dataset, gene) and cohort in catalog.gene(dataset, gene).cohorts
+
+def plot_render_key(digest, dataset, cohort, aa_window=None, fmt="png"):
+    # Cache key and ETag of a plot; it depends on the gene file contents (digest), cohort,
+    # titles and everything that changes the drawing. render_static.py names its files by it.
+    title, legend = plot_text(dataset, cohort)
+    options = dict(plot_options)
+    if aa_window is not None:
+        options["aa_window"] = aa_window
+    return render_key(digest, dataset, cohort, title, legend, fmt=fmt, **options)
+
+def table_plot_key(table, dataset, cohort, aa_window=None):
+    return plot_render_key(table.digest, dataset, cohort, aa_window)
+
+def plot_key(file_path, dataset, cohort, aa_window=None):
+    return table_plot_key(gene_cache.get(file_path), dataset, cohort, aa_window)
+
+def get_plot_png(file_path, dataset, cohort, aa_window=None):
+    # Return (png bytes, key), rendering the plot only if it is not cached yet
+    # Parsed, AA-sorted tables are cached, so switching cohorts skips the disk and pandas
+    return render_table_png(gene_cache.get(file_path), dataset, cohort, aa_window)
+
+def render_table_png(table, dataset, cohort, aa_window=None, upload=False):
+    # Return (png bytes, key) for a parsed gene table, from the render cache when possible.
+    # Uploads are private to their session, so they use a memory-only cache and are never
+    # written to disk or looked up in the pre-rendered bundle.
+    title, legend = plot_text(dataset, cohort)
+    key = table_plot_key(table, dataset, cohort, aa_window)
+    cache = upload_render_cache if upload else render_cache
+    png = cache.get(key)
+    if png is None and not upload:
+        # Plots pre-rendered by render_static.py are read from the bundle
+        png = static_plots.get(key)
+        if png is not None:
+            render_cache.put(key, png)
+    if png is None:
+        # Concurrent requests for the same plot share one render; raises RenderQueueFull
+        # or RenderTimeout when the pool is saturated or the render is too slow
+        # The render_pool phase includes the time waiting for a worker
+        with metrics.phase("render_pool"):
+            png, phases = render_pool.run(
+                key, render_plot_png, table.variants, table.exon_ranges, cohort, title, legend, aa_window,
+                timeout=render_timeout
+            )
+        metrics.add(phases)
+        cache.put(key, png)
+    return png, key
+
+@app.server.route("/plot/<dataset>/<gene>/<cohort>.png")
+@metrics.instrument("serve_plot")
+def serve_plot(dataset, gene, cohort):
+    # Only plots the app offers are rendered, so arbitrary URLs cannot fill the caches
+    if not plot_exists(dataset, gene, cohort):
+        abort(404)
+    file_path = os.path.join(data_dir, dataset, gene)
+    # Optional AA window, e.g. ?start=200&end=400
+    aa_window = None
+    if request.args.get("start") or request.args.get("end"):
+        xmax = aa_window_max(gene_cache.get(file_path))
+        try:
+            aa_window = parse_aa_window(request.args.get("start") or 0, request.args.get("end") or xmax, xmax)
+        except ValueError:
+            abort(400)
+    key = plot_key(file_path, dataset, cohort, aa_window)
+    if key in request.if_none_match:
+        response = make_response("", 304)
+    else:
+        try:
+            png, key = get_plot_png(file_path, dataset, cohort, aa_window)
+        except RenderQueueFull:
+            response = make_response("Too many plots are being rendered, try again shortly.", 503)
+            response.headers["Retry-After"] = "5"
+            return response
+        except RenderTimeout:
+            return make_response("The plot took too long to render.", 504)
+        response = make_response(png)
+        response.mimetype = "image/png"
+    response.set_etag(key)
+    if request.args.get("v") == key:
+        # Versioned URLs never change content
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        response.headers["Cache-Control"] = "public, no-cache"
+    return response
+
+def json_response(payload, status=200):
+    # JSON response, gzip-compressed when the client accepts it and it is worth it
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    response = make_response(body, status)
+    response.mimetype = "application/json"
+    response.vary.add("Accept-Encoding")
+    if len(body) >= 1024 and "gzip" in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+def api_arg(name, cast, default=None):
+    # Optional numeric query parameter; raises ValueError with a message for the client
+    value = request.args.get(name, "")
+    if value == "":
+        return default
+    try:
+        value = cast(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+    # float() accepts nan and inf
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a number")
+    return value
+
+def resolve_gene(dataset, gene):
+    # Accept the gene file name (PSEN1:NM_000021) or just the gene symbol (PSEN1)
+    genes = catalog.genes(dataset)
+    if gene in genes:
+        return gene
+    matches = [g for g in genes if g.split(":")[0] == gene]
+    return matches[0] if len(matches) == 1 else None
+
+@app.server.route("/api/datasets")
+def api_datasets():
+    return json_response({
+        "datasets": [
+            {"name": ds, "genes": list(catalog.genes(ds)), "cohorts": list(catalog.cohorts(ds))}
+            for ds in catalog.datasets()
+        ]
+    })
+
+@app.server.route("/api/variants")
+def api_variants():
+    # Variants of one gene in an AA range, with the counts of one cohort, in AA order.
+    # Answered from the same parsed tables the plots are drawn from.
+    dataset = request.args.get("dataset", "")
+    gene = request.args.get("gene", "")
+    cohort = request.args.get("cohort", "all")
+    exon = request.args.get("exon") or None
+    if not dataset or not gene:
+        return json_response({"error": "dataset and gene are required"}, 400)
+    try:
+        aa_start = api_arg("aa_start", float)
+        aa_end = api_arg("aa_end", float)
+        min_carriers = api_arg("min_carriers", int, 0)
+        offset = api_arg("offset", int, 0)
+        limit = api_arg("limit", int, api_page_size)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    if offset < 0 or not 1 <= limit <= api_max_page_size:
+        return json_response({"error": f"offset must be >= 0 and limit between 1 and {api_max_page_size}"}, 400)
+
+    gene_file = resolve_gene(dataset, gene) if dataset in catalog.datasets() else None
+    file_path = os.path.join(data_dir, dataset, gene_file or "")
+    if gene_file is None or not gene_exists(file_path):
+        return json_response({"error": f"gene {gene} not found in dataset {dataset}"}, 404)
+    table = gene_cache.get(file_path)
+    cohorts = header_cohorts(table.variants.columns)
+    if cohort not in cohorts:
+        return json_response({"error": f"cohort {cohort} not found, available cohorts: {', '.join(cohorts)}"}, 400)
+
+    index = variant_index_cache.get(table)
+    rows = index.query(aa_start, aa_end, exon)
+    if min_carriers > 0:
+        rows = rows[index.carriers(cohort)[rows] >= min_carriers]
+    total = len(rows)
+    return json_response({
+        "dataset": dataset,
+        "gene": gene_file,
+        "cohort": cohort,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + limit if offset + limit < total else None,
+        "variants": index.records(rows[offset:offset + limit], cohort),
+    })
+
+@app.server.route("/api/search")
+def api_search():
+    # Variants matching every term of q (prefix match on protein change, AA position or gene)
+    query = request.args.get("q", "")
+    try:
+        limit = api_arg("limit", int, search_result_limit)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    if not 1 <= limit <= api_max_page_size:
+        return json_response({"error": f"limit must be between 1 and {api_max_page_size}"}, 400)
+    total, hits = search_index.search(query, limit)
+    return json_response({
+        "query": query,
+        "total": total,
+        "results": [
+            {
+                "dataset": hit.dataset,
+                "gene": hit.gene,
+                "variant": hit.variant,
+                "AA": hit.AA,
+                "exon": hit.exon,
+                "counts": {cohort: {"Hom_A1": hom, "Het": het} for cohort, (hom, het) in hit.counts.items()},
+            }
+            for hit in hits
+        ],
+    })
+
+@app.server.before_request
+def start_request_timing():
+    metrics.begin()
+
+@app.server.after_request
+def finish_request_timing(response):
+    # Payload size of instrumented callbacks and routes, plus the optional debug timings
+    callback, elapsed, trace = metrics.end()
+    if callback is None:
+        return response
+    size = response.calculate_content_length() or 0
+    metrics.PAYLOAD_BYTES.observe(size, callback=callback)
+    if debug_timing:
+        timing = metrics.server_timing(trace, elapsed)
+        response.headers["Server-Timing"] = timing
+        app.server.logger.warning("%s %s: %d bytes, %s", callback, request.path, size, timing)
+    return response
+
+def cache_lookups():
+    render = render_cache.stats()
+    uploads = upload_render_cache.stats()
+    genes = gene_cache.stats()
+    return [
+        ({"cache": "upload_render", "result": "hit"}, uploads["memory_hits"]),
+        ({"cache": "upload_render", "result": "miss"}, uploads["misses"]),
+        ({"cache": "render", "result": "memory_hit"}, render["memory_hits"]),
+        ({"cache": "render", "result": "disk_hit"}, render["disk_hits"]),
+        ({"cache": "render", "result": "miss"}, render["misses"]),
+        ({"cache": "gene_table", "result": "hit"}, genes["hits"]),
+        ({"cache": "gene_table", "result": "miss"}, genes["misses"]),
+        ({"cache": "static_plots", "result": "hit"}, static_plots.hits),
+    ]
+
+def cache_hit_ratios():
+    ratios = []
+    for cache, lookups in (("render", render_cache.stats()), ("gene_table", gene_cache.stats())):
+        hits = lookups.get("hits", lookups.get("memory_hits", 0) + lookups.get("disk_hits", 0))
+        total = hits + lookups["misses"]
+        ratios.append(({"cache": cache}, hits / total if total else 0.0))
+    return ratios
+
+def render_pool_counts():
+    stats = render_pool.stats()
+    return [({"result": result}, stats[result]) for result in ("submitted", "coalesced", "rejected", "timeouts")]
+
+metrics.REGISTRY.register(metrics.Sampled(
+    "cache_lookups_total", "counter", "Lookups in the render and gene table caches by result.", cache_lookups
+))
+metrics.REGISTRY.register(metrics.Sampled(
+    "cache_hit_ratio", "gauge", "Share of cache lookups answered from the cache since startup.", cache_hit_ratios
+))
+metrics.REGISTRY.register(metrics.Sampled(
+    "renders_in_flight", "gauge", "Renders running or waiting for a worker.", render_pool.in_flight
+))
+metrics.REGISTRY.register(metrics.Sampled(
+    "render_requests_total", "counter", "Render requests by outcome (coalesced ones shared a running render).", render_pool_counts
+))
+metrics.REGISTRY.register(metrics.Sampled(
+    "render_cache_bytes", "gauge", "Memory used by rendered plots.", lambda: render_cache.stats()["bytes"]
+))
+metrics.REGISTRY.register(metrics.Sampled(
+    "gene_cache_bytes", "gauge", "Memory used by parsed gene tables.", lambda: gene_cache.stats()["bytes"]
+))
+metrics.REGISTRY.register(metrics.Sampled(
+    "startup_seconds", "gauge", "Time from importing the app to being ready, by startup step.",
+    lambda: [({"step": step}, seconds) for step, seconds in startup_times.items()]
+))
+metrics.REGISTRY.register(metrics.Sampled(
+    "upload_store_bytes", "gauge", "Memory used by uploaded gene files.", lambda: upload_store.stats()["bytes"]
+))
+
+@app.server.route("/metrics")
+def serve_metrics():
+    response = make_response(metrics.REGISTRY.render())
+    response.mimetype = "text/plain"
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+@app.callback(
+    Output("search-results", "children"),
+    Input("search-input", "value"),
+    prevent_initial_call=True
+)
+def update_search_results(query):
+    import dash_bootstrap_components as dbc
+    if not query or not query.strip():
+        return []
+    total, hits = search_index.search(query, search_result_limit)
+    if not hits:
+        return html.P("No variants found.", style={"color": "#555"})
+    labels = dict(cohort_categories)
+    rows = []
+    for n, hit in enumerate(hits):
+        # One button per cohort with carriers; clicking it opens that plot
+        buttons = [
+            dbc.Button(f"{labels.get(cohort, cohort)} {hom}/{het}",
+                       id={"type": "search-result", "index": f"{n}|{hit.dataset}|{hit.gene}|{cohort}"},
+                       n_clicks=0, size="sm", color="warning", outline=True, className="me-1 mb-1")
+            for cohort, (hom, het) in hit.counts.items() if hom + het > 0
+        ]
+        rows.append(html.Div([
+            html.Strong(f"{hit.gene.split(':')[0]} {hit.variant}"),
+            html.Span(f" AA {hit.AA}, exon {hit.exon} · {hit.dataset.upper()} ", style={"color": "#555"}),
+            *(buttons or [html.Span("no carriers", style={"color": "#999"})]),
+        ], className="mb-1"))
+    if total > len(hits):
+        rows.append(html.P(f"Showing {len(hits)} of {total} variants, refine the search to see more.", style={"color": "#555"}))
+    return rows
+
+@app.callback(
+    Output("selected-dataset", "data", allow_duplicate=True),
+    Output("selected-cohort", "data", allow_duplicate=True),
+    Output("file-dropdown", "options", allow_duplicate=True),
+    Output("file-dropdown", "value"),
+    Input({"type": "search-result", "index": ALL}, "n_clicks"),
+    prevent_initial_call=True
+)
+def open_search_result(n_clicks_list):
+    # Select the dataset, gene and cohort of the clicked result so update_plot draws it
+    from dash import callback_context
+    ctx = callback_context
+    if not ctx.triggered or not ctx.triggered[0]["value"]:
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    _, dataset, gene, cohort = ctx.triggered_id["index"].split("|", 3)
+    options = [{"label": f, "value": os.path.join(dataset, f)} for f in catalog.genes(dataset)]
+    return dataset, cohort, options, os.path.join(dataset, gene)
+
+@app.callback(
+    Output("plot-data", "data"),
+    Input("file-dropdown", "value"),
+    Input("selected-dataset", "data"),
+    Input("selected-cohort", "data"),
+    Input("render-mode", "value"),
+    State("session-id", "data")
+)
+def update_plot_data(selected_file, selected_dataset, selected_cohort, render_mode, session_id):
+    if not selected_file or not selected_dataset or not selected_cohort or render_mode != "interactive":
+        return None
+    table = selected_table(selected_file, session_id, selected_cohort)
+    if table is None:
+        return None
+    from plotting import plot_data
+    title, legend = plot_text(selected_dataset, selected_cohort)
+    return plot_data(table.variants, table.exon_ranges, selected_cohort, title, legend, cluster_distance)
+
+# Drawn in the browser by assets/lollipop.js
+app.clientside_callback(
+    ClientsideFunction(namespace="variantVisualizer", function_name="lollipopFigure"),
+    Output("plot-graph", "figure"),
+    Input("plot-data", "data")
+)
+
+@app.callback(
+    Output("plot-graph", "style"),
+    Output("plot-image", "style"),
+    Output("aa-window-container", "style"),
+    Input("render-mode", "value"),
+    Input("plot-data", "data")
+)
+def toggle_render_mode(render_mode, data):
+    hidden = {"display": "none"}
+    if render_mode == "interactive":
+        return ({"width": "100%"} if data else hidden), hidden, hidden
+    return hidden, {"width": "100%", "height": "auto"}, {"marginTop": "10px"}
+
+def plot_text(selected_dataset, selected_cohort):
+    # Return the title and the dataset/cohort legend (or None) shown on a plot
     title = custom_titles.get(selected_cohort, f"Variants in {selected_cohort.replace('_', ' ').title()}")
-    plt.title(title, fontsize=14)
-    if selected_dataset in legend_map and selected_cohort in legend_map[selected_dataset]:
-        plt.figtext(
-            0.5,
-            -0.1,
-            legend_map[selected_dataset][selected_cohort],
-            wrap=True,
-            ha="center",
-            fontsize=8
-        )
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png", bbox_inches="tight", dpi=300)
-    plt.close(fig)
-    buf.seek(0)
-    encoded_image = base64.b64encode(buf.read()).decode("utf-8")
-    return f"data:image/png;base64,{encoded_image}"
+    legend = legend_map.get(selected_dataset, {}).get(selected_cohort)
+    return title, legend
+
+def render_plot_png(variants, exon_ranges, selected_cohort, title, legend, aa_window=None):
+    # (PNG, timed phases) of one gene and cohort with the app's drawing settings (see
+    # plotting.py); it runs on a render worker, so its phases are handed back to the request
+    # Imported on first use (or by the warm-up), so importing the app does not load matplotlib
+    from plotting import render_plot
+    metrics.begin()
+    try:
+        png = render_plot(variants, exon_ranges, selected_cohort, title, legend, aa_window, fmt="png", **plot_options)
+    finally:
+        _, _, phases = metrics.end()
+    return png, phases
+
+def __getattr__(name):
+    # app.server (as in gunicorn app:server) is the Flask server of the app set up by create_app
+    if name == "server":
+        return create_app().server
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Uncomment to run locally
 # if __name__ == "__main__":
-#     app.run_server(debug=True)
+#     create_app().run_server(debug=True)
@@ -0,0 +1,125 @@
+// Client-side drawing of the lollipop plot for the interactive render mode.
+// The server only sends the clustered variants and exon ranges (see plot_data
+// in plotting.py); the Plotly figure is built here so zoom, pan and hover never
+// need a round-trip to the server.
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    variantVisualizer: {
+        lollipopFigure: function (data) {
+            if (!data) {
+                return {data: [], layout: {}};
+            }
+
+            // Same layout constants as build_figure and draw_clusters in plotting.py
+            var baseY = -0.07;
+            var y = -0.03;
+            var exonY = -0.08;
+            var exonHeight = 0.005;
+            var minWidth = 5;
+            // matplotlib's Paired colormap, used for the exon bars
+            var colors = [
+                "#a6cee3", "#1f78b4", "#b2df8a", "#33a02c", "#fb9a99", "#e31a1c",
+                "#fdbf6f", "#ff7f00", "#cab2d6", "#6a3d9a", "#ffff99", "#b15928"
+            ];
+
+            var clusters = data.clusters;
+            var traces = [];
+            var annotations = [];
+
+            // Stems: a single trace with breaks between clusters
+            var stemX = [];
+            var stemY = [];
+            // Dots: one per variant in the cluster, stacked downwards
+            var dotX = [];
+            var dotY = [];
+            var dotText = [];
+            for (var i = 0; i < clusters.x.length; i++) {
+                var x = clusters.x[i];
+                var size = clusters.size[i];
+                var label = clusters.label[i];
+                stemX.push(x, x, null);
+                stemY.push(baseY, y, null);
+                for (var j = 0; j < size; j++) {
+                    dotX.push(x);
+                    dotY.push(y - j * 0.005);
+                    dotText.push(label.split("\n").join("<br>"));
+                }
+                annotations.push({
+                    x: x,
+                    y: y + size * 0.003 + 0.01,
+                    text: label.split("\n").join("<br>"),
+                    textangle: -90,
+                    showarrow: false,
+                    xanchor: "center",
+                    yanchor: "bottom",
+                    font: {size: 8, color: "black"}
+                });
+            }
+            traces.push({
+                x: stemX, y: stemY, mode: "lines", type: "scatter",
+                line: {color: "black", width: 1},
+                hoverinfo: "skip", showlegend: false
+            });
+            traces.push({
+                x: dotX, y: dotY, mode: "markers", type: "scatter",
+                marker: {color: "black", size: 4},
+                text: dotText,
+                hovertemplate: "AA %{x:.0f}<br>%{text}<extra></extra>",
+                showlegend: false
+            });
+
+            // Exon bars, one legend entry per exon
+            var exons = data.exons;
+            for (var k = 0; k < exons.exon.length; k++) {
+                var start = exons.start[k];
+                var end = exons.end[k];
+                if (end - start < minWidth) {
+                    start -= minWidth / 2;
+                    end += minWidth / 2;
+                }
+                traces.push({
+                    x: [start, end], y: [exonY, exonY], mode: "lines", type: "scatter",
+                    line: {color: colors[k % colors.length], width: 6},
+                    name: String(exons.exon[k]),
+                    hovertemplate: "Exon " + exons.exon[k] + ": AA %{x:.0f}<extra></extra>"
+                });
+            }
+
+            if (data.legend) {
+                annotations.push({
+                    x: 0.5, y: -0.35, xref: "paper", yref: "paper",
+                    text: data.legend.split("\n").join("<br>"),
+                    showarrow: false, xanchor: "center", yanchor: "top",
+                    font: {size: 10}
+                });
+            }
+
+            return {
+                data: traces,
+                layout: {
+                    title: {text: data.title, font: {size: 16}},
+                    xaxis: {
+                        title: {text: "Amino Acid Position"},
+                        range: [0, data.xmax], showgrid: false, zeroline: false
+                    },
+                    yaxis: {
+                        title: {text: "Carriers (Homozygous/Heterozygous)", font: {size: 10}},
+                        range: [-0.1, 0.25], showticklabels: false, showgrid: false,
+                        zeroline: false, fixedrange: true
+                    },
+                    shapes: [{
+                        type: "rect", layer: "below", line: {width: 0},
+                        fillcolor: "lightgray",
+                        x0: 1, x1: data.xmax,
+                        y0: exonY - exonHeight / 2, y1: exonY + exonHeight / 2
+                    }],
+                    annotations: annotations,
+                    legend: {title: {text: "Exons"}},
+                    plot_bgcolor: "white",
+                    margin: {b: 160},
+                    height: 550
+                }
+            };
+        }
+    }
+});
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Description: Performance benchmark suite on synthetic data (see synthetic_data.py).
+#              For gene tables of 10 to 100k variants and 2 to 50 cohorts it times
+#                - cluster:          clustering of one gene and cohort on its own
+#                - update_plot:      the update_plot callback for a gene file in image mode,
+#                                    phase by phase (parse, cluster, draw, savefig, ...),
+#                                    plus serving the PNG from /plot
+#                - upload_plot:      uploading the same gene file under CUSTOM and plotting
+#                                    it (decode, parse, render and base64 phases)
+#                - extract_variants: extract_variants.py end to end on a synthetic ANNOVAR
+#                                    table with the same number of rows (also --chunksize)
+#              Every case runs in its own process, so its peak memory is measured alone.
+#              Results can be saved as a baseline JSON; later runs compared against it
+#              exit with status 1 when a case got slower or uses more memory.
+#
+# Example:
+#   python benchmarks/bench_suite.py --quick --save-baseline benchmarks/baseline.json
+#   python benchmarks/bench_suite.py --quick --baseline benchmarks/baseline.json
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "data_preprocessing"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import write_annovar_table, write_gene_file  # noqa: E402
+
+
+BENCHMARKS = ["cluster", "update_plot", "upload_plot", "extract_variants", "extract_variants_streaming"]
+VARIANTS = [10, 1000, 10000, 100000]
+COHORTS = [2, 10, 50]
+QUICK_VARIANTS = [10, 1000, 10000]
+QUICK_COHORTS = [2, 10]
+
+DATASET = "synthetic"
+GENE = "SYN1:NM_000001"
+
+# Compared with when --baseline is not given, if it exists
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# A case is slower than its baseline when it takes more than (1 + tolerance) times as
+# long plus a small absolute slack, so that millisecond-scale cases do not fail on noise
+TIME_SLACK = 0.005
+MEMORY_SLACK_MB = 16
+
+def case_id(bench, variants, cohorts):
+    return f"{bench}/{variants}v/{cohorts}c"
+
+# (current, peak) resident memory of this process in MB. On Linux both come from /proc,
+# because ru_maxrss survives exec and would include the peak of the parent process.
+# Elsewhere the current size is unknown and ru_maxrss (bytes on macOS) is used for both.
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            status = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(status["VmRSS"].split()[0]) / 2**10, int(status["VmHWM"].split()[0]) / 2**10
+    except (OSError, KeyError, ValueError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss = rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+        return rss, rss
+
+# Reset the peak to the current size (Linux only), so the next peak is the benchmark's own
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+# Input files of one size, written once per run by the parent process
+
+def case_files(workdir, variants, cohorts):
+    base = os.path.join(workdir, f"{variants}v_{cohorts}c")
+    gene_path = os.path.join(base, DATASET, GENE)
+    annovar_path = os.path.join(base, "synthetic.annotated-variant-counts.tsv")
+    isoforms_path = os.path.join(base, "isoforms.json")
+    if not os.path.exists(isoforms_path):
+        write_gene_file(gene_path, variants, cohorts, gene=GENE.split(":")[0])
+        _, mapping = write_annovar_table(annovar_path, variants, cohorts)
+        with open(isoforms_path, "w") as f:
+            json.dump(mapping, f)
+    return {"base": base, "gene": gene_path, "annovar": annovar_path, "isoforms": isoforms_path}
+
+# Run fn repeat times and return (best seconds, phases of the best run, result of the best run).
+# fn returns (phases dict, result).
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        phases, result = fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, phases, result)
+    return best
+
+def sum_phases(trace):
+    phases = {}
+    for name, seconds in trace:
+        phases[name] = phases.get(name, 0.0) + seconds
+    return phases
+
+def bench_cluster(files, variants, cohorts, repeat):
+    from clustering import cluster_variants
+    from gene_tables import gene_source
+
+    table = gene_source(files["gene"])[1]()
+    cohort = [c[:-len(".Het")] for c in table.variants.columns if c.endswith(".Het")][0]
+    seconds, phases, clusters = best_of(lambda: ({}, cluster_variants(table.variants, cohort)), repeat)
+    return {"seconds": seconds, "phases": phases, "throughput": variants / seconds, "unit": "variants/s",
+            "clusters": len(clusters)}
+
+# Fresh, memory-only caches so that every repetition parses and renders from scratch
+
+def reset_app_caches(app):
+    from render_cache import RenderCache
+    from render_static import StaticPlots
+
+    app.gene_cache.clear()
+    app.render_cache = RenderCache(app.render_cache_max_bytes)
+    app.static_plots = StaticPlots(os.path.join(tempfile.gettempdir(), "bench-no-static-plots"))
+
+def bench_update_plot(files, variants, cohorts, repeat):
+    import app
+    import metrics
+
+    client = app.create_app().server.test_client()
+
+    def run():
+        reset_app_caches(app)
+        metrics.begin()
+        try:
+            url, status = app.update_plot(f"{DATASET}/{GENE}", DATASET, "all", "image", None, None, None)
+        finally:
+            _, elapsed, trace = metrics.end()
+        if status is not None or not url:
+            raise RuntimeError(f"update_plot did not return a plot: {status}")
+        phases = sum_phases(trace)
+        phases["update_plot"] = elapsed
+        start = time.perf_counter()
+        response = client.get(url)
+        phases["serve"] = time.perf_counter() - start
+        return phases, len(response.data)
+
+    seconds, phases, payload = best_of(run, repeat)
+    return {"seconds": seconds, "phases": phases, "throughput": variants / seconds, "unit": "variants/s",
+            "payload_bytes": payload}
+
+def bench_upload_plot(files, variants, cohorts, repeat):
+    import base64
+
+    import app
+    import metrics
+    from upload_store import UploadStore
+
+    with open(files["gene"], "rb") as f:
+        contents = "data:text/tab-separated-values;base64," + base64.b64encode(f.read()).decode()
+    app.upload_store = UploadStore(2**34, 3600, 2**34)
+
+    def run():
+        reset_app_caches(app)
+        metrics.begin()
+        try:
+            stored, _ = app.store_uploaded_file(contents, GENE, "bench")
+            src, status = app.update_plot(stored["handle"], app.upload_dataset, "all", "image", None, None, "bench")
+        finally:
+            _, elapsed, trace = metrics.end()
+        if status is not None or not src:
+            raise RuntimeError(f"update_plot did not return a plot: {status}")
+        phases = sum_phases(trace)
+        phases["total"] = elapsed
+        return phases, len(src)
+
+    seconds, phases, payload = best_of(run, repeat)
+    return {"seconds": seconds, "phases": phases, "throughput": variants / seconds, "unit": "variants/s",
+            "payload_bytes": payload, "upload_bytes": len(contents)}
+
+def bench_extract(files, variants, cohorts, repeat, chunksize=None):
+    import extract_variants
+
+    out_dir = os.path.join(files["base"], "extracted")
+    argv = ["extract_variants.py", "--input", files["annovar"], "--isoforms", files["isoforms"], "--output-dir", out_dir]
+    if chunksize:
+        argv += ["--chunksize", str(chunksize)]
+
+    def run():
+        # Streaming mode appends to existing files
+        for name in os.listdir(out_dir) if os.path.isdir(out_dir) else []:
+            os.remove(os.path.join(out_dir, name))
+        sys.argv = argv
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            extract_variants.main()
+        return {}, len(os.listdir(out_dir))
+
+    seconds, phases, genes = best_of(run, repeat)
+    return {"seconds": seconds, "phases": phases, "throughput": variants / seconds, "unit": "rows/s",
+            "genes": genes}
+
+def run_case(bench, variants, cohorts, files, repeat):
+    runners = {
+        "cluster": bench_cluster,
+        "update_plot": bench_update_plot,
+        "upload_plot": bench_upload_plot,
+        "extract_variants": bench_extract,
+        "extract_variants_streaming": lambda *args: bench_extract(*args, chunksize=max(1000, variants // 10)),
+    }
+    # Imports are done before measuring, so peak memory is that of the benchmark itself
+    import pandas  # noqa: F401
+    if bench in ("update_plot", "upload_plot"):
+        import app
+        import plotting  # noqa: F401
+        # The catalog is scanned by the first create_app, so it must see the synthetic data
+        app.data_dir = files["base"]
+        app.create_app()
+    reset_peak_rss()
+    rss_before, _ = rss_mb()
+    result = runners[bench](files, variants, cohorts, repeat)
+    result["peak_rss_mb"] = rss_mb()[1]
+    result["memory_mb"] = max(0.0, result["peak_rss_mb"] - rss_before)
+    return result
+
+# Compare results with a baseline; returns a list of regression messages
+
+def compare(results, baseline, tolerance, memory_tolerance):
+    regressions = []
+    for case, result in results.items():
+        base = baseline.get(case)
+        if base is None:
+            continue
+        limit = base["seconds"] * (1 + tolerance) + TIME_SLACK
+        if result["seconds"] > limit:
+            regressions.append(
+                f"{case}: {result['seconds'] * 1000:.1f} ms, baseline {base['seconds'] * 1000:.1f} ms "
+                f"(+{(result['seconds'] / base['seconds'] - 1) * 100:.0f}%)"
+            )
+        limit = base["memory_mb"] * (1 + memory_tolerance) + MEMORY_SLACK_MB
+        if result["memory_mb"] > limit:
+            regressions.append(f"{case}: {result['memory_mb']:.0f} MB, baseline {base['memory_mb']:.0f} MB")
+    return regressions
+
+def print_result(case, result, base=None):
+    phases = ", ".join(f"{name} {seconds * 1000:.1f}" for name, seconds in result["phases"].items())
+    change = ""
+    if base is not None:
+        change = f"  ({(result['seconds'] / base['seconds'] - 1) * 100:+.0f}% vs baseline)"
+    print(f"{case:40s} {result['seconds'] * 1000:10.1f} ms {result['throughput']:12.0f} {result['unit']:10s}"
+          f" {result['memory_mb']:7.1f} MB{change}")
+    if phases:
+        print(f"{'':40s} ms: {phases}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark clustering, update_plot and extract_variants.py on synthetic data.")
+    parser.add_argument("--bench", nargs="+", choices=BENCHMARKS, default=BENCHMARKS, help="Benchmarks to run (default: all)")
+    parser.add_argument("--variants", nargs="+", type=int, help=f"Variants per gene file (default: {VARIANTS})")
+    parser.add_argument("--cohorts", nargs="+", type=int, help=f"Cohorts per gene file (default: {COHORTS})")
+    parser.add_argument("--quick", action="store_true", help=f"Smaller sizes: {QUICK_VARIANTS} variants, {QUICK_COHORTS} cohorts")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per case (best time is reported)")
+    parser.add_argument("--workdir", help="Directory for the synthetic inputs (default: a temporary directory)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Baseline JSON to compare with (default: benchmarks/baseline.json, if it exists)")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Save the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs the baseline (default: 0.25 = 25%%)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="Allowed peak memory growth vs the baseline")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        # Child process: run one case and print its result as JSON
+        bench, variants, cohorts, files = json.loads(args.case)
+        print(json.dumps(run_case(bench, variants, cohorts, files, args.repeat)))
+        return
+
+    variants = args.variants or (QUICK_VARIANTS if args.quick else VARIANTS)
+    cohorts = args.cohorts or (QUICK_COHORTS if args.quick else COHORTS)
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    baseline = {}
+    if not args.save_baseline:
+        if os.path.exists(baseline_path):
+            with open(baseline_path) as f:
+                baseline = json.load(f)["results"]
+        elif args.baseline:
+            sys.exit(f"Baseline {args.baseline} not found")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="variant-bench-") as tmp:
+        workdir = args.workdir or tmp
+        for n_variants in variants:
+            for n_cohorts in cohorts:
+                files = case_files(workdir, n_variants, n_cohorts)
+                for bench in args.bench:
+                    case = case_id(bench, n_variants, n_cohorts)
+                    proc = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), "--repeat", str(args.repeat),
+                         "--case", json.dumps([bench, n_variants, n_cohorts, files])],
+                        cwd=ROOT, capture_output=True, text=True,
+                    )
+                    if proc.returncode != 0:
+                        print(proc.stderr, file=sys.stderr)
+                        sys.exit(f"{case} failed")
+                    results[case] = json.loads(proc.stdout.strip().splitlines()[-1])
+                    print_result(case, results[case], baseline.get(case))
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=1, sort_keys=True)
+            print(f"Wrote {path}")
+
+    regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+    if regressions:
+        print(f"\nPERFORMANCE REGRESSION: {len(regressions)} case(s) are worse than the baseline {baseline_path}", file=sys.stderr)
+        for message in regressions:
+            print(f"  {message}", file=sys.stderr)
+        sys.exit(1)
+    if baseline:
+        print(f"\nNo regressions against {baseline_path}")
+    elif not args.save_baseline:
+        print(f"\nNo baseline at {baseline_path}; no comparison was done")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Description: Generators of synthetic inputs for the benchmarks: per-gene files in the
+#              format the app reads (Gene.refGene, variant, AA, exon, <cohort>.Hom_A1,
+#              <cohort>.Het) and ANNOVAR-merged variant count tables like the
+#              *.annotated-variant-counts.tsv inputs of extract_variants.py.
+#              Generation is seeded, so the same arguments always give the same files.
+#
+# Example:
+#   python benchmarks/synthetic_data.py --variants 100000 --cohorts 50 --output-dir /tmp/synthetic
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+AMINO_ACIDS = np.array(list("ACDEFGHIKLMNPQRSTVWY"))
+BASES = np.array(list("ACGT"))
+
+# Cohort names: the usual categories first, then numbered ones
+KNOWN_COHORTS = ["all", "ad", "ftd", "aao", "healthy"]
+
+# ExonicFunc.refGene values of exonic rows and how often they occur; synonymous SNVs
+# are filtered out by extract_variants.py by default
+EXONIC_FUNCS = {
+    "nonsynonymous SNV": 0.55,
+    "synonymous SNV": 0.25,
+    "frameshift deletion": 0.06,
+    "nonframeshift deletion": 0.06,
+    "stopgain": 0.06,
+    "stoploss": 0.02,
+}
+
+# Share of ANNOVAR rows that are exonic; the others are UTR, intronic or splicing
+EXONIC_SHARE = 0.7
+OTHER_FUNCS = ["UTR5", "UTR3", "intronic", "splicing"]
+
+def cohort_names(n):
+    return (KNOWN_COHORTS + [f"cohort{i}" for i in range(len(KNOWN_COHORTS), n)])[:n]
+
+# Protein length and exon count of a synthetic gene with n variants. Long proteins
+# with dense variants are what biobank-scale datasets look like.
+
+def protein_shape(n_variants):
+    length = max(300, min(n_variants // 2, 35000))
+    exons = max(3, min(length // 100, 80))
+    return length, exons
+
+# Genotype counts of n variants in one cohort: most variants are rare, a few are common.
+# Returns (Hom_A1, Het, Hom_A2) for a cohort of cohort_size individuals.
+
+def genotype_counts(rng, n, cohort_size):
+    het = np.minimum(rng.geometric(0.45, n) - 1, cohort_size)
+    common = rng.random(n) < 0.02
+    het[common] = rng.integers(10, max(11, cohort_size // 4), common.sum())
+    hom = np.where(rng.random(n) < 0.05, rng.integers(0, 3, n), 0)
+    hom = np.minimum(hom, cohort_size - het)
+    return hom, het, cohort_size - het - hom
+
+# Synthetic per-gene table with n_variants rows and counts for n_cohorts cohorts,
+# in the column order extract_variants.py writes.
+
+def gene_table(n_variants, n_cohorts, gene="SYN1", seed=0):
+    rng = np.random.default_rng(seed)
+    length, exons = protein_shape(n_variants)
+    aa = np.sort(rng.integers(1, length + 1, n_variants))
+    ref = rng.choice(AMINO_ACIDS, n_variants)
+    alt = rng.choice(AMINO_ACIDS, n_variants)
+    columns = {
+        "Gene.refGene": np.full(n_variants, gene),
+        "variant": np.char.add(np.char.add(ref, aa.astype(str)), alt),
+        "AA": aa,
+        "exon": 1 + (aa - 1) * exons // length,
+    }
+    for cohort in cohort_names(n_cohorts):
+        hom, het, _ = genotype_counts(rng, n_variants, int(rng.integers(100, 1000)))
+        columns[f"{cohort}.Hom_A1"] = hom
+        columns[f"{cohort}.Het"] = het
+    return pd.DataFrame(columns)
+
+def write_gene_file(path, n_variants, n_cohorts, gene="SYN1", seed=0):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    gene_table(n_variants, n_cohorts, gene, seed).to_csv(path, sep="\t", index=False)
+    return path
+
+# One AAChange.refGene entry, e.g. "SYN1:NM_000001:exon3:c.A124G:p.K42E"
+
+def aa_change(gene, isoform, exon, aa, ref, alt, bases):
+    return f"{gene}:{isoform}:exon{exon}:c.{bases[0]}{aa * 3}{bases[1]}:p.{ref}{aa}{alt}"
+
+# Synthetic ANNOVAR-merged variant count table with n_rows rows spread over n_genes genes,
+# with Hom_A1/Het/Hom_A2 counts for n_cohorts cohorts. Exonic rows list one to three
+# isoforms in AAChange.refGene; the first isoform of every gene is the one in the returned
+# gene -> isoform mapping. Returns (table, mapping).
+
+def annovar_table(n_rows, n_cohorts, n_genes=20, seed=0):
+    rng = np.random.default_rng(seed)
+    genes = [f"SYN{i + 1}" for i in range(n_genes)]
+    isoforms = {gene: [f"NM_{100000 + 10 * i + k:06d}" for k in range(3)] for i, gene in enumerate(genes)}
+    gene_idx = np.sort(rng.integers(0, n_genes, n_rows))
+    length, exons = protein_shape(max(1, n_rows // n_genes))
+    aa = rng.integers(1, length + 1, n_rows)
+    exon = 1 + (aa - 1) * exons // length
+    ref = rng.choice(AMINO_ACIDS, n_rows)
+    alt = rng.choice(AMINO_ACIDS, n_rows)
+    bases = rng.choice(BASES, (n_rows, 2))
+    n_isoforms = rng.integers(1, 4, n_rows)
+    exonic = rng.random(n_rows) < EXONIC_SHARE
+    exonic_func = rng.choice(list(EXONIC_FUNCS), n_rows, p=list(EXONIC_FUNCS.values()))
+    other_func = rng.choice(OTHER_FUNCS, n_rows)
+
+    func, exonic_col, changes = [], [], []
+    for row in range(n_rows):
+        gene = genes[gene_idx[row]]
+        if exonic[row]:
+            func.append("exonic")
+            exonic_col.append(exonic_func[row])
+            changes.append(",".join(
+                aa_change(gene, isoforms[gene][k], exon[row] + k, aa[row] + 2 * k, ref[row], alt[row], bases[row])
+                for k in range(n_isoforms[row])
+            ))
+        else:
+            func.append(other_func[row])
+            exonic_col.append(".")
+            changes.append(".")
+
+    start = 1_000_000 + gene_idx * 100_000 + aa * 3
+    columns = {
+        "Chr": 1 + gene_idx % 22,
+        "Start": start,
+        "End": start,
+        "Ref": bases[:, 0],
+        "Alt": bases[:, 1],
+        "Func.refGene": func,
+        "Gene.refGene": [genes[i] for i in gene_idx],
+        "GeneDetail.refGene": ".",
+        "ExonicFunc.refGene": exonic_col,
+        "AAChange.refGene": changes,
+        "ID": [f"rs{100000 + row}" for row in range(n_rows)],
+        "A1": bases[:, 1],
+        "A2": bases[:, 0],
+    }
+    for cohort in cohort_names(n_cohorts):
+        hom, het, hom_a2 = genotype_counts(rng, n_rows, int(rng.integers(100, 1000)))
+        columns[f"{cohort}.Hom_A1"] = hom
+        columns[f"{cohort}.Het"] = het
+        columns[f"{cohort}.Hom_A2"] = hom_a2
+    mapping = {gene: isoforms[gene][0] for gene in genes}
+    return pd.DataFrame(columns), mapping
+
+def write_annovar_table(path, n_rows, n_cohorts, n_genes=20, seed=0):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    table, mapping = annovar_table(n_rows, n_cohorts, n_genes, seed)
+    table.to_csv(path, sep="\t", index=False)
+    return path, mapping
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic gene file and ANNOVAR variant count table.")
+    parser.add_argument("--variants", type=int, default=10000, help="Variants in the gene file and rows in the ANNOVAR table")
+    parser.add_argument("--cohorts", type=int, default=5, help="Number of cohorts with counts")
+    parser.add_argument("--genes", type=int, default=20, help="Genes in the ANNOVAR table")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output-dir", required=True, help="Directory for the generated files")
+    args = parser.parse_args()
+
+    gene_path = write_gene_file(
+        os.path.join(args.output_dir, "synthetic", "SYN1:NM_000001"), args.variants, args.cohorts, seed=args.seed
+    )
+    annovar_path, mapping = write_annovar_table(
+        os.path.join(args.output_dir, "synthetic.annotated-variant-counts.tsv"),
+        args.variants, args.cohorts, args.genes, args.seed,
+    )
+    isoforms_path = os.path.join(args.output_dir, "synthetic_isoforms.json")
+    with open(isoforms_path, "w") as f:
+        json.dump(mapping, f, indent=1)
+    print(f"Wrote {gene_path}, {annovar_path} and {isoforms_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Catalog of the datasets and gene files under ``data/``.
+
+The catalog records, for every gene file of every dataset, its path, size,
+mtime, number of variants and the cohorts it has counts for (the ``<cohort>.Het``
+columns of its header). It is built by scanning the data directory once and is
+then refreshed by a background polling thread; only files whose mtime or size
+changed are read again, and only their header line is parsed.
+
+Callbacks read from an immutable snapshot, so lookups never touch the disk and
+never wait for a refresh in progress.
+"""
+
+import os
+import threading
+from collections import namedtuple
+
+from gene_tables import STORE_SUFFIX, open_store, store_path_for
+
+
+# One gene of a dataset. For genes that only exist in the consolidated store,
+# path is the store file and size/mtime are those of the store.
+GeneEntry = namedtuple("GeneEntry", ["path", "size", "mtime", "variants", "cohorts"])
+
+# Genes and cohorts of one dataset; cohorts are in order of first appearance
+Dataset = namedtuple("Dataset", ["genes", "entries", "cohorts"])
+
+
+def header_cohorts(columns):
+    """Return the cohort names of the ``<cohort>.Het`` columns of a gene file header."""
+    return tuple(col[:-len(".Het")] for col in columns if col.endswith(".Het"))
+
+
+def scan_gene_file(path, stat):
+    """Read the header of a gene file and count its variant lines."""
+    with open(path, "rb") as f:
+        header = f.readline().decode("utf-8").rstrip("\r\n")
+        variants = 0
+        last = b"\n"
+        for block in iter(lambda: f.read(1 << 20), b""):
+            variants += block.count(b"\n")
+            last = block[-1:]
+        if last != b"\n":
+            variants += 1
+    return GeneEntry(path, stat.st_size, stat.st_mtime, variants, header_cohorts(header.split("\t")))
+
+
+class Catalog:
+    """Index of the datasets in data_dir, kept up to date by polling.
+
+    Datasets listed in order come first in that order, the others follow
+    alphabetically. Directories named in exclude (e.g. the upload folder) and
+    hidden files are ignored.
+    """
+
+    def __init__(self, data_dir, order=(), exclude=()):
+        self.data_dir = data_dir
+        self.order = list(order)
+        self.exclude = set(exclude)
+        self._datasets = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._listeners = []
+        self.refresh()
+
+    def refresh(self):
+        """Rescan the data directory, re-reading only files that changed."""
+        with self._lock:
+            previous = self._datasets
+            names = set()
+            if os.path.isdir(self.data_dir):
+                for name in os.listdir(self.data_dir):
+                    if name.startswith(".") or name in self.exclude:
+                        continue
+                    path = os.path.join(self.data_dir, name)
+                    if os.path.isdir(path):
+                        names.add(name)
+                    elif name.endswith(STORE_SUFFIX):
+                        names.add(name[:-len(STORE_SUFFIX)])
+            datasets = {}
+            for name in names:
+                old = previous.get(name)
+                datasets[name] = self._scan_dataset(name, old.entries if old else {})
+            # Swapped in one assignment, so readers see either the old or the new snapshot
+            self._datasets = datasets
+        for listener in list(self._listeners):
+            listener(self)
+
+    def add_listener(self, listener):
+        """Call listener(catalog) after every refresh."""
+        self._listeners.append(listener)
+
+    def _scan_dataset(self, name, old_entries):
+        dataset_dir = os.path.join(self.data_dir, name)
+        entries = {}
+        if os.path.isdir(dataset_dir):
+            for gene in os.listdir(dataset_dir):
+                path = os.path.join(dataset_dir, gene)
+                if gene.startswith(".") or not os.path.isfile(path):
+                    continue
+                try:
+                    stat = os.stat(path)
+                    old = old_entries.get(gene)
+                    if old is not None and old.path == path and (old.mtime, old.size) == (stat.st_mtime, stat.st_size):
+                        entries[gene] = old
+                    else:
+                        entries[gene] = scan_gene_file(path, stat)
+                except (OSError, UnicodeDecodeError):
+                    # Removed or unreadable while scanning; picked up on the next refresh
+                    continue
+
+        # Genes that are only in the consolidated store are described by its index
+        store_path = store_path_for(dataset_dir)
+        store = open_store(store_path)
+        if store is not None:
+            stat = os.stat(store_path)
+            for gene, entry in store.index.items():
+                if gene not in entries:
+                    entries[gene] = GeneEntry(
+                        store_path, stat.st_size, stat.st_mtime, entry["length"], header_cohorts(entry["columns"])
+                    )
+
+        cohorts = []
+        for gene in sorted(entries):
+            cohorts.extend(c for c in entries[gene].cohorts if c not in cohorts)
+        return Dataset(sorted(entries), entries, tuple(cohorts))
+
+    def start(self, interval):
+        """Refresh the catalog every interval seconds in a daemon thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._poll, args=(interval,), name="catalog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except OSError:
+                continue
+
+    def datasets(self):
+        """Return the dataset names, those in order first."""
+        names = self._datasets.keys()
+        ordered = [name for name in self.order if name in names]
+        return ordered + sorted(name for name in names if name not in ordered)
+
+    def genes(self, dataset):
+        """Return the sorted gene file names of a dataset."""
+        entry = self._datasets.get(dataset)
+        return entry.genes if entry else []
+
+    def cohorts(self, dataset):
+        """Return the cohorts with counts in any gene file of a dataset."""
+        entry = self._datasets.get(dataset)
+        return entry.cohorts if entry else ()
+
+    def gene(self, dataset, gene):
+        """Return the GeneEntry of one gene, or None."""
+        entry = self._datasets.get(dataset)
+        return entry.entries.get(gene) if entry else None
@@ -0,0 +1,51 @@
+"""Grouping of nearby variants into the clusters drawn on the lollipop plot."""
+
+import numpy as np
+import pandas as pd
+
+
+CLUSTER_COLUMNS = ["start", "end", "exon", "x", "size", "carriers", "label"]
+
+
+def cluster_variants(variants, cohort, cluster_distance=10):
+    """Cluster AA-sorted variants and aggregate the counts of one cohort.
+
+    A new cluster starts whenever the exon changes or the gap to the previous
+    variant is larger than cluster_distance amino acids. Returns one row per
+    cluster with its AA range, exon, centroid (x), number of variants (size),
+    number of carriers in the cohort and the label listing every variant with
+    carriers as "<variant> (<Hom_A1> / <Het>)", one per line.
+    """
+    if variants.empty:
+        return pd.DataFrame(columns=CLUSTER_COLUMNS)
+
+    aa = variants["AA"].to_numpy()
+    exon = variants["exon"].to_numpy()
+    new_cluster = np.ones(len(variants), dtype=bool)
+    new_cluster[1:] = (exon[1:] != exon[:-1]) | (np.abs(np.diff(aa)) > cluster_distance)
+    cluster_id = np.cumsum(new_cluster) - 1
+
+    # Cohorts missing from the file count as zero carriers
+    hom_col = f"{cohort}.Hom_A1"
+    het_col = f"{cohort}.Het"
+    hom = variants[hom_col] if hom_col in variants else pd.Series(0, index=variants.index)
+    het = variants[het_col] if het_col in variants else pd.Series(0, index=variants.index)
+    carriers = (hom + het).fillna(0)
+    has_carriers = carriers > 0
+
+    grouped = pd.DataFrame({"AA": aa, "carriers": carriers.to_numpy()}).groupby(cluster_id)
+    clusters = pd.DataFrame({
+        "start": grouped["AA"].min(),
+        "end": grouped["AA"].max(),
+        "exon": exon[new_cluster],
+        "x": grouped["AA"].sum() / grouped.size(),
+        "size": grouped.size(),
+        "carriers": grouped["carriers"].sum(),
+    })
+
+    labels = (
+        variants["variant"].astype(str) + " (" + hom.astype(str) + " / " + het.astype(str) + ")"
+    )[has_carriers.to_numpy()]
+    clusters["label"] = labels.groupby(cluster_id[has_carriers.to_numpy()]).agg("\n".join)
+    clusters["label"] = clusters["label"].fillna("")
+    return clusters.reset_index(drop=True)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Description: Build the consolidated variant store of a dataset: a single uncompressed
+#              Arrow IPC file (e.g. data/tangl.arrow next to data/tangl/) holding every gene
+#              table with typed columns, plus a gene index in the file metadata. The app
+#              memory-maps it instead of parsing one text file per gene.
+#
+# Example (import an existing directory of per-gene TSV files):
+#   python data_preprocessing/build_variant_store.py data/tangl
+
+import argparse
+import glob
+import hashlib
+import io
+import json
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+
+
+# Schema metadata key holding the gene index:
+# {"GENE:ISOFORM": {"offset": first row, "length": rows, "columns": [...], "sha256": ...}}
+# sha256 is the hash of the gene's TSV text, so it matches the hash of the per-gene file.
+GENE_INDEX_KEY = b"gene_index"
+
+# Default store location for a dataset directory: data/tangl → data/tangl.arrow
+
+def store_path(dataset_dir):
+    return os.path.normpath(dataset_dir) + ".arrow"
+
+# Cast one gene table (as read from its TSV) to the store types: AA and exon as
+# nullable integers, genotype counts as nullable 32-bit integers, everything else as text.
+
+def typed_gene_table(df):
+    typed = {}
+    for col in df.columns:
+        if col in ("AA", "exon"):
+            typed[col] = pd.to_numeric(df[col], errors="coerce").astype("Int32")
+        elif col.endswith((".Hom_A1", ".Het", ".Hom_A2")):
+            typed[col] = pd.to_numeric(df[col], errors="coerce").astype("Int32")
+        else:
+            typed[col] = df[col].astype("string")
+    return pd.DataFrame(typed)
+
+# Write the store from (gene name, TSV bytes) pairs. Rows keep their order within each gene.
+
+def write_variant_store(gene_files, path):
+
+    frames = []
+    index = {}
+    offset = 0
+    for name, raw in sorted(gene_files):
+        df = typed_gene_table(pd.read_csv(io.BytesIO(raw), sep="\t"))
+        index[name] = {
+            "offset": offset,
+            "length": len(df),
+            "columns": df.columns.tolist(),
+            "sha256": hashlib.sha256(raw).hexdigest(),
+        }
+        offset += len(df)
+        frames.append(df)
+
+    table = pa.Table.from_pandas(pd.concat(frames, ignore_index=True), preserve_index=False)
+    table = table.replace_schema_metadata({GENE_INDEX_KEY: json.dumps(index).encode("utf-8")})
+
+    # Uncompressed IPC file so it can be memory-mapped and read without copies
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return index
+
+# Read every per-gene TSV file (no extension, hidden files skipped) in a dataset directory.
+
+def read_gene_files(paths):
+    gene_files = []
+    for path in paths:
+        with open(path, "rb") as f:
+            gene_files.append((os.path.basename(path), f.read()))
+    return gene_files
+
+def dataset_files(dataset_dir):
+    return sorted(
+        path for path in glob.glob(os.path.join(dataset_dir, "*"))
+        if os.path.isfile(path) and not os.path.basename(path).startswith(".")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the consolidated Arrow variant store of a dataset from its per-gene TSV files."
+    )
+    parser.add_argument(
+        "dataset_dir",
+        help="Directory with one TSV file per gene, e.g. data/tangl"
+    )
+    parser.add_argument(
+        "-o", "--out",
+        help="Path of the store to write (default: <dataset_dir>.arrow)"
+    )
+    args = parser.parse_args()
+
+    paths = dataset_files(args.dataset_dir)
+    if not paths:
+        print(f"No gene files found in {args.dataset_dir}.", file=sys.stderr)
+        sys.exit(1)
+    out_path = args.out or store_path(args.dataset_dir)
+    index = write_variant_store(read_gene_files(paths), out_path)
+    rows = sum(entry["length"] for entry in index.values())
+    print(f"Wrote {rows} variants from {len(index)} genes to {out_path}")
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@
 ## This script requires the following software:
 # ANNOVAR (https://annovar.openbioinformatics.org/en/latest/user-guide/download/)
 # Plink 1.9 (https://www.cog-genomics.org/plink2/)
-# bcftools, python3 and pandas
+# bcftools, python3, numpy and pandas
 
 # To run this script start by adding the neccessaty files and paths in lines 20, 24, 25 and 33. 
 # Then do:
@@ -46,12 +46,24 @@ cohorts='cohorts-redlat.txt'
 #   sample_003
 
 
+## OPTIONAL: RESTRICT THE ANALYSIS TO THE GENES OF INTEREST
+
+# Provide the gene→isoform mapping (a JSON file or string, the same one given to
+# extract_variants.py --isoforms) to only annotate and count variants within those transcripts.
+# The regions are padded by 'region_padding' bases on each side to keep nearby splicing variants.
+# Leave empty to analyze the whole VCF.
+isoforms=''
+region_padding=5000
+
+
 #================SCRIPT
 
 ## PART ONE: ANNOTATE VCF
 
 echo "Starting script on $(date)"
 
+script_dir="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
 ## 1. Locate and prepare the input VCF file
 
 # Check for an uncompressed VCF file
@@ -73,6 +85,40 @@ else
 fi
 
 
+## 1b. Optionally restrict the VCF to the target genes
+
+# Every later step (ID assignment, ANNOVAR, PLINK import and counting) then only sees
+# the variants within the padded transcripts of the genes in the isoform mapping.
+if [[ -n "$isoforms" ]]; then
+    echo "Restricting ${vcf_file}.vcf.gz to the transcripts in the isoform mapping..."
+
+    # Index the input VCF so bcftools can jump straight to each region
+    if [[ ! -f "${vcf_file}.vcf.gz.tbi" && ! -f "${vcf_file}.vcf.gz.csi" ]]; then
+        tabix -p vcf "${vcf_file}.vcf.gz"
+    fi
+
+    # Match the chromosome naming of the VCF (chr1 vs 1)
+    strip_chr=''
+    if ! tabix -l "${vcf_file}.vcf.gz" | grep -q '^chr'; then
+        strip_chr='--strip-chr'
+    fi
+
+    python3 "${script_dir}/isoforms_to_bed.py" \
+        --isoforms "$isoforms" \
+        --refgene "${annovar_database_PATH}/hg38_refGene.txt" \
+        --padding "$region_padding" \
+        ${strip_chr} \
+        --out "${vcf_file}.regions.bed" || exit 1
+
+    bcftools view \
+        --regions-file "${vcf_file}.regions.bed" \
+        --output-type z "${vcf_file}.vcf.gz" > "${vcf_file}_regions.vcf.gz"
+
+    # Update the vcf_file variable to point to the restricted file
+    vcf_file="${vcf_file}_regions"
+fi
+
+
 ## 2. Assign Variant Identifiers and Remove Monomorphic Variants
 
 echo "Assigning variant identifiers..."
@@ -185,96 +231,27 @@ plink --vcf "${annovar_file}.vcf.gz" \
 # --double-id Use the same string for both FID and IID
 # --keep-allele-order Preserve REF/ALT allele ordering from VCF
 
-## 2. Count Genotypes for All Variants and All Samples in the Dataset
-
-# More info in: https://www.cog-genomics.org/plink/1.9/formats#frqx
-
-echo "Using PLINK to count genotype frequencies for all samples..."
-
-plink --bfile "${plink_file}" \
-    --freqx \
-    --allow-no-sex \
-    --nonfounders \
-    --out "${plink_file}.all"
-
-# --freqx Outputs extended count information per variant
-# --allow-no-sex  Skip sex check (useful if sex data is missing)
-# --nonfounders Allow inclusion of samples with parental information in the .fam file
-# Output will end in ".frqx"
-
-# Retain Variant ID and Genotypic Counts from PLINK Output
+## 2. Count Genotypes for All Samples and Sub-Cohorts
 
-echo "Retaining variant ID and genotypic counts..."
-
-# Replace spaces with underscores in the .frqx file (ensures compatibility with parsing tools)
-sed -i 's/ /_/g' "${plink_file}.all.frqx"
-
-# Extract relevant columns:
-# $2 = SNP ID
-# $3 = Allele1
-# $4 = Allele2
-# $5 = HOM_A1 count
-# $6 = HET count
-# $7 = HOM_A2 count
-awk -v OFS='\t' '{print $2, $3, $4, $5, $6, $7}' "${plink_file}.all.frqx" > "${plink_file}.cohort-counts.txt"
-
-# Clean and standardize header names for downstream compatibility
-sed -i 's/SNP/ID/g' "${plink_file}.cohort-counts.txt"
-sed -i 's/C(HOM_A1)/all.Hom_A1/g' "${plink_file}.cohort-counts.txt"
-sed -i 's/C(HET)/all.Het/g' "${plink_file}.cohort-counts.txt"
-sed -i 's/C(HOM_A2)/all.Hom_A2/g' "${plink_file}.cohort-counts.txt"
-
-
-## 3. Count SNPs in Sub-Cohorts
+# count_genotypes.py memory-maps the PLINK .bed file once and counts
+# Hom_A1/Het/Hom_A2 for all samples and every cohort listed in '$cohorts' in a single pass.
+# It produces the same columns as running "plink --freqx" for the whole dataset and for each cohort:
+# ID, A1, A2, all.Hom_A1, all.Het, all.Hom_A2, <cohort>.Hom_A1, <cohort>.Het, <cohort>.Hom_A2, ...
+# As with --freqx, A1 is the minor allele across all samples (the same A1 is used for every cohort).
+# Genotypes on sex chromosomes are counted as diploid.
 
 if [[ -f "$cohorts" && -s "$cohorts" ]]; then
-    echo "Using PLINK to count variant carriers in sub-cohorts listed in '$cohorts'..."
-
-    # Append a new line to ensure all the values in your list are inlcuded in the while read loop
-    [ -s "$cohorts" ] && [ "$(tail -c1 "$cohorts")" != "" ] && echo >> "$cohorts"
-     
-    # Step 1: Prepare .plink sample lists for each cohort
-
-    while read -r line; do
-        # Create a two-column file for PLINK (FID and IID — here both are the sample ID)
-        awk '{ print $1, $1 }' "$line" > "${line}.plink"
-    done < "$cohorts"
-
-    # Step 2: Process each cohort and extract genotype counts
-    while read -r line; do 
-        echo "Processing cohort: $line"
-
-        # Count genotype frequencies for the cohort
-        plink --bfile "$plink_file" \
-            --keep "${line}.plink" \
-            --freqx \
-            --allow-no-sex \
-            --nonfounders \
-            --out "${plink_file}.$line"
-
-        # Create a 3-column genotype matrix: Hom_A1, Het, Hom_A2
-        cat <(awk -v OFS='\t' 'BEGIN { print "Hom_A1", "Het", "Hom_A2" }') \
-            <(awk -v OFS='\t' 'NR > 1 { print $5, $6, $7 }' "${plink_file}.$line.frqx") \
-            > "${plink_file}.$line.geno"
-
-        # Prefix headers with the cohort name for clarity
-        sed -i "s/Hom_A1/${line}.Hom_A1/" "${plink_file}.$line.geno" 
-        sed -i "s/Het/${line}.Het/" "${plink_file}.$line.geno"
-        sed -i "s/Hom_A2/${line}.Hom_A2/" "${plink_file}.$line.geno"
-
-        # Append this cohort's genotype counts to the main cohort counts matrix
-        echo "Adding counts for $line to the aggregated cohort count file..."
-        paste "${plink_file}.cohort-counts.txt" "${plink_file}.$line.geno" > "${plink_file}.cohort-counts.temp"
-        mv "${plink_file}.cohort-counts.temp" "${plink_file}.cohort-counts.txt"
-
-    done < "$cohorts"
-
-    # Move final result to annovar_file prefix for consistency
-    mv "${plink_file}.cohort-counts.txt" "${annovar_file}.cohort-counts.txt"
-
-else    
+    echo "Counting genotypes for all samples and the sub-cohorts listed in '$cohorts'..."
+    python3 "${script_dir}/count_genotypes.py" \
+        --bfile "${plink_file}" \
+        --cohorts "$cohorts" \
+        --out "${annovar_file}.cohort-counts.txt"
+else
     echo "Cohorts file not found or empty. Skipping sub-cohort analysis."
     echo "Using counts from the entire cohort only."
+    python3 "${script_dir}/count_genotypes.py" \
+        --bfile "${plink_file}" \
+        --out "${annovar_file}.cohort-counts.txt"
 fi
 
 
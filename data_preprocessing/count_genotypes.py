@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Description: Count Hom_A1/Het/Hom_A2 genotypes per variant for all samples and every
+#              sub-cohort in a single pass over a PLINK 1 binary fileset (.bed/.bim/.fam).
+#              Replaces the per-cohort "plink --freqx" runs in count-variation.sh and
+#              writes the same "<cohort>.Hom_A1 / .Het / .Hom_A2" columns.
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+# First three bytes of a SNP-major PLINK 1 .bed file
+BED_MAGIC = bytes([0x6C, 0x1B, 0x01])
+
+# 2-bit genotype codes in a .bed file, relative to the alleles in .bim columns 5 (A1) and 6 (A2)
+HOM_A1, MISSING, HET, HOM_A2 = 0b00, 0b01, 0b10, 0b11
+
+# Genotype codes of the 4 samples packed in each byte value (lowest bits first)
+BYTE_TO_CODES = np.array(
+    [[(byte >> (2 * k)) & 0b11 for k in range(4)] for byte in range(256)], dtype=np.uint8
+)
+
+# Read the variant table of a PLINK fileset.
+
+def read_bim(prefix):
+    return pd.read_csv(
+        f"{prefix}.bim", sep=r"\s+", header=None, dtype=str,
+        names=["chrom", "ID", "cm", "pos", "A1", "A2"]
+    )
+
+# Read the sample IDs (IID, second column) of a PLINK fileset.
+
+def read_fam(prefix):
+    fam = pd.read_csv(f"{prefix}.fam", sep=r"\s+", header=None, dtype=str, usecols=[0, 1])
+    return fam[1].tolist()
+
+# Read the cohort names listed in the cohorts file (one per line) and the sample IDs in
+# the file named after each cohort (first column, no header), as in count-variation.sh.
+# Returns a list of (cohort name, set of sample IDs).
+
+def read_cohorts(cohorts_file, cohort_dir="."):
+    cohorts = []
+    with open(cohorts_file) as f:
+        names = [line.strip() for line in f if line.strip()]
+    for name in names:
+        with open(os.path.join(cohort_dir, name)) as f:
+            samples = {line.split()[0] for line in f if line.strip()}
+        cohorts.append((name, samples))
+    return cohorts
+
+# Sample-by-group membership matrix: one column for all samples plus one per cohort.
+
+def membership_matrix(sample_ids, cohorts):
+    membership = np.zeros((len(sample_ids), len(cohorts) + 1), dtype=np.float32)
+    membership[:, 0] = 1
+    for j, (_, samples) in enumerate(cohorts, start=1):
+        membership[:, j] = [sample in samples for sample in sample_ids]
+    return membership
+
+# Count genotypes for every variant and group in one pass over the memory-mapped .bed file.
+# The 2-bit genotypes of a block of variants are decoded with a lookup table and the
+# per-group counts are obtained with one matrix product per genotype class, so the .bed
+# is read once whatever the number of cohorts.
+# Returns an int64 array of shape (n_variants, n_groups, 3) with Hom_A1, Het and Hom_A2 counts.
+# With variant_range=(start, end) only those variants are counted (and returned), which
+# lets several processes split one file between them.
+
+def count_genotypes(bed_path, n_variants, membership, block_bytes=64 * 1024 * 1024, variant_range=None):
+
+    n_samples = membership.shape[0]
+    bytes_per_variant = (n_samples + 3) // 4
+    bed = np.memmap(bed_path, dtype=np.uint8, mode="r")
+    if bed[:3].tobytes() != BED_MAGIC:
+        raise ValueError(f"{bed_path} is not a SNP-major PLINK 1 .bed file")
+    expected = 3 + n_variants * bytes_per_variant
+    if bed.shape[0] != expected:
+        raise ValueError(f"{bed_path} has {bed.shape[0]} bytes, expected {expected} from the .bim and .fam files")
+    genotypes = bed[3:].reshape(n_variants, bytes_per_variant)
+
+    first, last = variant_range or (0, n_variants)
+    counts = np.zeros((last - first, membership.shape[1], 3), dtype=np.int64)
+    # Decode enough variants at a time to keep the unpacked block around block_bytes
+    block = max(1, block_bytes // (bytes_per_variant * 4))
+    for start in range(first, last, block):
+        end = min(start + block, last)
+        codes = BYTE_TO_CODES[genotypes[start:end]].reshape(end - start, -1)[:, :n_samples]
+        for k, code in enumerate((HOM_A1, HET, HOM_A2)):
+            # float32 products are exact for counts below 2**24 samples
+            counts[start - first:end - first, :, k] = np.rint((codes == code).astype(np.float32) @ membership)
+    return counts
+
+# Build the cohort-counts table written by count-variation.sh:
+# ID, A1, A2, all.Hom_A1, all.Het, all.Hom_A2, then the same three columns per cohort.
+# Like plink --freqx, A1 is the minor allele across all samples unless keep_allele_order
+# is set; the orientation is decided once, so every cohort uses the same A1.
+
+def counts_table(bim, counts, cohort_names, keep_allele_order=False):
+
+    counts = counts.copy()
+    a1 = bim["A1"].to_numpy(copy=True)
+    a2 = bim["A2"].to_numpy(copy=True)
+    if not keep_allele_order:
+        all_counts = counts[:, 0, :]
+        a1_alleles = 2 * all_counts[:, 0] + all_counts[:, 1]
+        a2_alleles = 2 * all_counts[:, 2] + all_counts[:, 1]
+        swap = a1_alleles > a2_alleles
+        a1[swap], a2[swap] = a2[swap], a1[swap]
+        counts[swap] = counts[swap][:, :, ::-1]
+
+    table = pd.DataFrame({"ID": bim["ID"], "A1": a1, "A2": a2})
+    for j, name in enumerate(["all"] + cohort_names):
+        table[f"{name}.Hom_A1"] = counts[:, j, 0]
+        table[f"{name}.Het"] = counts[:, j, 1]
+        table[f"{name}.Hom_A2"] = counts[:, j, 2]
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Count genotypes per variant for all samples and each cohort from a PLINK .bed/.bim/.fam fileset."
+    )
+    parser.add_argument(
+        "-b", "--bfile", required=True,
+        help="PLINK fileset prefix (without .bed/.bim/.fam)"
+    )
+    parser.add_argument(
+        "-c", "--cohorts",
+        help="File listing one cohort name per line; each cohort needs a file of sample IDs named after it"
+    )
+    parser.add_argument(
+        "--cohort-dir", default=".",
+        help="Directory containing the per-cohort sample files (default: current directory)"
+    )
+    parser.add_argument(
+        "-o", "--out", required=True,
+        help="Path of the tab-delimited cohort counts table to write"
+    )
+    parser.add_argument(
+        "--keep-allele-order", action="store_true",
+        help="Keep A1/A2 as in the .bim file instead of making A1 the minor allele"
+    )
+    args = parser.parse_args()
+
+    bim = read_bim(args.bfile)
+    sample_ids = read_fam(args.bfile)
+    cohorts = []
+    if args.cohorts and os.path.isfile(args.cohorts) and os.path.getsize(args.cohorts) > 0:
+        cohorts = read_cohorts(args.cohorts, args.cohort_dir)
+    else:
+        print("Cohorts file not found or empty. Counting the entire cohort only.", file=sys.stderr)
+
+    membership = membership_matrix(sample_ids, cohorts)
+    for j, (name, samples) in enumerate(cohorts, start=1):
+        print(f"Cohort {name}: {int(membership[:, j].sum())} of {len(samples)} samples found in {args.bfile}.fam")
+
+    counts = count_genotypes(f"{args.bfile}.bed", len(bim), membership)
+    table = counts_table(bim, counts, [name for name, _ in cohorts], args.keep_allele_order)
+    table.to_csv(args.out, sep="\t", index=False)
+    print(f"Wrote genotype counts for {len(table)} variants and {len(cohorts) + 1} groups to {args.out}")
+
+if __name__ == "__main__":
+    main()
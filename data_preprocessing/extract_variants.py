@@ -49,6 +49,127 @@ def extract_variant(row, desired_isoforms):
     # No matching isoform found
     return None, None, ""
 
+# Pattern for a single AAChange.refGene entry, e.g. "PSEN1:NM_000021:exon8:c.A839C:p.E280A".
+# Entries need at least 4 colon-separated fields; the protein change is always the last one.
+AACHANGE_PATTERN = r"^(?P<gene>[^:]*):(?P<isoform>[^:]*):(?P<exon>[^:]*):(?:.*:)?(?P<change>[^:]*)$"
+
+# Columnar equivalent of calling extract_variant on every row of a DataFrame.
+# Splits AAChange.refGene into one row per isoform entry, keeps the entries whose
+# gene/isoform pair is in desired_isoforms and takes the first match per row.
+# Returns a DataFrame with variant, AA and exon columns, indexed like df and
+# containing only the rows with a matching isoform.
+
+def extract_variants_columnar(df, desired_isoforms):
+
+    # Only exonic rows carry a protein change
+    aa_changes = df.loc[df["Func.refGene"] == "exonic", "AAChange.refGene"].astype(str)
+
+    # One row per isoform entry; the index still points at the original row
+    entries = aa_changes.str.split(",").explode()
+    fields = entries.str.extract(AACHANGE_PATTERN).dropna(subset=["gene"])
+
+    # Join against the gene→isoform mapping and keep the first matching entry of each row
+    fields = fields[fields["gene"].map(desired_isoforms) == fields["isoform"]]
+    fields = fields[~fields.index.duplicated(keep="first")]
+
+    # Exon number without the "exon" prefix, variant without the leading 'p.'
+    # and the amino acid position between the reference and alternate residues
+    exon = fields["exon"].str.replace(r"\D", "", regex=True)
+    variant = fields["change"].str.replace(r"^p\.", "", regex=True)
+    aa = variant.str.slice(1, -1).where(variant.str.len() > 2, "")
+
+    return pd.DataFrame({"variant": variant, "AA": aa, "exon": exon})
+
+# Build the per-variant output table (Gene.refGene, variant, AA, exon and the extra
+# columns) for the rows of df with a matching isoform.
+
+def extract_records(df, desired_isoforms, extra_cols):
+
+    changes = extract_variants_columnar(df, desired_isoforms)
+    matched = df.loc[changes.index]
+    return pd.concat(
+        [matched[["Gene.refGene"]], changes, matched[extra_cols]], axis=1
+    ).reset_index(drop=True)
+
+# Annotation columns needed to filter rows and extract the isoform changes
+ANNOTATION_COLS = ["Func.refGene", "Gene.refGene", "ExonicFunc.refGene", "AAChange.refGene"]
+
+# Extra columns copied to the per-gene outputs: from the 14th onward, skipping any containing 'A2'
+
+def select_extra_cols(all_cols):
+    return [c for c in all_cols[13:] if 'A2' not in c]
+
+# Read the input in chunks of `chunksize` rows and yield the extracted records of each chunk.
+# Only the annotation and extra columns are loaded; genotype count columns are read as
+# nullable 32-bit integers, so missing counts are written as empty fields.
+# Yields (number of rows left after filtering, records DataFrame) per chunk.
+
+def stream_records(path, desired_isoforms, func_ref, exonic_func, chunksize):
+
+    all_cols = pd.read_csv(path, sep="\t", nrows=0).columns.tolist()
+    extra_cols = select_extra_cols(all_cols)
+    count_cols = [c for c in extra_cols if c.endswith((".Hom_A1", ".Het"))]
+    text_cols = [c for c in ANNOTATION_COLS + extra_cols if c not in count_cols]
+
+    dtypes = {c: "Int32" for c in count_cols}
+    dtypes.update({c: str for c in text_cols})
+    reader = pd.read_csv(
+        path, sep="\t", usecols=ANNOTATION_COLS + extra_cols, dtype=dtypes, chunksize=chunksize
+    )
+    for chunk in reader:
+        chunk[text_cols] = chunk[text_cols].fillna("")
+        chunk = chunk[
+            chunk["Func.refGene"].isin(func_ref) &
+            chunk["ExonicFunc.refGene"].isin(exonic_func)
+        ]
+        yield len(chunk), extract_records(chunk, desired_isoforms, extra_cols)
+
+# Streaming version of main(): filters and extracts one chunk at a time and appends
+# each gene's records to its output file, so memory use is bounded by the chunk size.
+
+def write_streaming(args, desired_isoforms):
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    written = {}
+    filtered_rows = 0
+    for n_rows, records in stream_records(
+        args.input, desired_isoforms, args.func_ref, args.exonic_func, args.chunksize
+    ):
+        filtered_rows += n_rows
+        for gene, gene_df in records.groupby("Gene.refGene", sort=False):
+            if gene not in desired_isoforms:
+                continue
+            out_path = os.path.join(args.output_dir, f"{gene}:{desired_isoforms[gene]}")
+            # Overwrite any file from a previous run on the first chunk, append afterwards
+            first = gene not in written
+            gene_df.to_csv(out_path, sep="\t", index=False, mode="w" if first else "a", header=first)
+            written[gene] = written.get(gene, 0) + len(gene_df)
+
+    if filtered_rows == 0:
+        print("No rows after filtering. Check filter criteria.", file=sys.stderr)
+        sys.exit(1)
+
+    out_paths = []
+    for gene in desired_isoforms:
+        if gene not in written:
+            print(f"No variants found for {gene} selected isoform {desired_isoforms[gene]}. Skipping.", file=sys.stderr)
+            continue
+        out_path = os.path.join(args.output_dir, f"{gene}:{desired_isoforms[gene]}")
+        print(f"Wrote {written[gene]} records to {out_path}")
+        out_paths.append(out_path)
+    return out_paths
+
+# Write the consolidated Arrow store of the output directory (<output-dir>.arrow) from the
+# per-gene files that were just written. Needs pyarrow.
+
+def write_store(output_dir, out_paths):
+
+    from build_variant_store import read_gene_files, store_path, write_variant_store
+
+    path = store_path(output_dir)
+    index = write_variant_store(read_gene_files(out_paths), path)
+    print(f"Wrote {sum(entry['length'] for entry in index.values())} records from {len(index)} genes to {path}")
+
 # Load the gene→isoform mapping from either a JSON file or a JSON string.
 # Exits on parse errors.
 
@@ -63,6 +184,47 @@ def load_isoforms(mapping_str):
         print(f"Error parsing isoforms mapping: {e}", file=sys.stderr)
         sys.exit(1)
 
+# Original (non-streaming) mode: load the whole input, then write one TSV per gene.
+# Returns the paths of the files written.
+
+def write_in_memory(args, desired_isoforms):
+
+    # Read input TSV into a DataFrame (fill missing with empty strings)
+    df = pd.read_csv(args.input, sep="\t", low_memory=False).fillna("")
+
+    # Filter rows by Func.refGene and ExonicFunc.refGene values
+    df_filtered = df[
+        df.get("Func.refGene").isin(args.func_ref) &
+        df.get("ExonicFunc.refGene").isin(args.exonic_func)
+    ]
+    if df_filtered.empty:
+        print("No rows after filtering. Check filter criteria.", file=sys.stderr)
+        sys.exit(1)
+
+    # Determine extra columns: from the 14th onward, skipping any containing 'A2'
+    extra_cols = select_extra_cols(df.columns.tolist())
+
+    # Extract the variant, AA and exon of the desired isoforms for all rows at once
+    result_df = extract_records(df_filtered, desired_isoforms, extra_cols)
+
+    # Ensure output directory exists
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Write one TSV per gene in the mapping
+    out_paths = []
+    for gene in desired_isoforms:
+        gene_df = result_df[result_df["Gene.refGene"] == gene]
+        if gene_df.empty:
+            print(f"No variants found for {gene} selected isoform {desired_isoforms[gene]}. Skipping.", file=sys.stderr)
+            continue
+        out_path = os.path.join(args.output_dir, f"{gene}:{desired_isoforms[gene]}")
+        # The file will be saved as a tab-separated file, but without the .tsv extension unless you include it in the filename.
+        # out_path = os.path.join(args.output_dir, f"{gene}:{desired_isoforms[gene]}.tsv")
+        gene_df.to_csv(out_path, sep="\t", index=False)
+        print(f"Wrote {len(gene_df)} records to {out_path}")
+        out_paths.append(out_path)
+    return out_paths
+
 
 def main():
     # Set up argument Parser with descriptions and defaults
@@ -100,61 +262,27 @@ def main():
         ],
         help="One or more ExonicFunc.refGene values to include; default excludes synonymous SNV"
     )
+    parser.add_argument(
+        "--chunksize", type=int, default=None,
+        help="Stream the input in chunks of this many rows to bound memory use on large tables; "
+             "genotype counts are then written as integers with missing counts left empty"
+    )
+    parser.add_argument(
+        "--store", action="store_true",
+        help="Also write the consolidated Arrow store of all genes to <output-dir>.arrow (requires pyarrow)"
+    )
     args = parser.parse_args()
 
     # Load the desired isoform mapping
     desired_isoforms = load_isoforms(args.isoforms)
 
-    # Read input TSV into a DataFrame (fill missing with empty strings)
-    df = pd.read_csv(args.input, sep="\t", low_memory=False).fillna("")
+    if args.chunksize:
+        out_paths = write_streaming(args, desired_isoforms)
+    else:
+        out_paths = write_in_memory(args, desired_isoforms)
 
-    # Filter rows by Func.refGene and ExonicFunc.refGene values
-    df_filtered = df[
-        df.get("Func.refGene").isin(args.func_ref) &
-        df.get("ExonicFunc.refGene").isin(args.exonic_func)
-    ]
-    if df_filtered.empty:
-        print("No rows after filtering. Check filter criteria.", file=sys.stderr)
-        sys.exit(1)
-
-    # Determine extra columns: from the 14th onward, skipping any containing 'A2'
-    all_cols = df.columns.tolist()
-    extra_cols = [c for c in all_cols[13:] if 'A2' not in c]
-
-    # Iterate over filtered rows and extract variants + extra data
-    records = []
-    for _, row in df_filtered.iterrows():
-        variant, aa, exon = extract_variant(row, desired_isoforms)
-        if variant is None:
-            continue  # skip if no matching isoform
-
-        # Build output record
-        record = {
-            "Gene.refGene": row["Gene.refGene"],
-            "variant": variant,
-            "AA": aa,
-            "exon": exon,
-        }
-        # Append values for extra columns
-        for col in extra_cols:
-            record[col] = row[col]
-        records.append(record)
-
-    # Create output DataFrame and ensure output directory exists
-    result_df = pd.DataFrame(records)
-    os.makedirs(args.output_dir, exist_ok=True)
-
-    # Write one TSV per gene in the mapping
-    for gene in desired_isoforms:
-        gene_df = result_df[result_df["Gene.refGene"] == gene]
-        if gene_df.empty:
-            print(f"No variants found for {gene} selected isoform {desired_isoforms[gene]}. Skipping.", file=sys.stderr)
-            continue
-        out_path = os.path.join(args.output_dir, f"{gene}:{desired_isoforms[gene]}")
-        # The file will be saved as a tab-separated file, but without the .tsv extension unless you include it in the filename.
-        # out_path = os.path.join(args.output_dir, f"{gene}:{desired_isoforms[gene]}.tsv")
-        gene_df.to_csv(out_path, sep="\t", index=False)
-        print(f"Wrote {len(gene_df)} records to {out_path}")
+    if args.store and out_paths:
+        write_store(args.output_dir, out_paths)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Description: Turn the gene→isoform mapping used by extract_variants.py into a BED file
+#              of the target transcripts (padded on both sides), using the ANNOVAR refGene
+#              table. count-variation.sh uses it to restrict the VCF to the genes of interest
+#              before annotation and counting.
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from extract_variants import load_isoforms
+
+
+# Column names of the UCSC genePred table shipped with ANNOVAR (hg38_refGene.txt)
+GENEPRED_COLS = [
+    "name", "chrom", "strand", "txStart", "txEnd", "cdsStart", "cdsEnd",
+    "exonCount", "exonStarts", "exonEnds", "score", "name2",
+]
+
+# Read the transcript table. ANNOVAR's refGene file has a leading "bin" column.
+
+def read_refgene(path):
+    refgene = pd.read_csv(path, sep="\t", header=None, dtype=str)
+    if refgene[0].str.fullmatch(r"\d+").all():
+        refgene = refgene.iloc[:, 1:]
+    refgene = refgene.iloc[:, :len(GENEPRED_COLS)]
+    refgene.columns = GENEPRED_COLS
+    refgene["txStart"] = refgene["txStart"].astype(int)
+    refgene["txEnd"] = refgene["txEnd"].astype(int)
+    # Match isoforms without their version suffix (NM_000021.4 → NM_000021)
+    refgene["isoform"] = refgene["name"].str.replace(r"\.\d+$", "", regex=True)
+    return refgene
+
+# Build the padded target regions for every gene/isoform pair in the mapping.
+# Transcripts on alternative/unplaced contigs (names containing '_') are ignored and
+# overlapping regions are merged, so that no variant is selected twice.
+# Returns a DataFrame with chrom, start (0-based), end and name columns.
+
+def target_regions(desired_isoforms, refgene, padding, strip_chr=False):
+
+    wanted = pd.DataFrame(
+        [(gene, str(isoform).split(".")[0]) for gene, isoform in desired_isoforms.items()],
+        columns=["name2", "isoform"]
+    )
+    transcripts = refgene.merge(wanted, on=["name2", "isoform"])
+    transcripts = transcripts[~transcripts["chrom"].str.contains("_")]
+
+    found = set(transcripts["name2"])
+    for gene, isoform in desired_isoforms.items():
+        if gene not in found:
+            print(f"Isoform {isoform} of {gene} not found in the refGene table. Skipping.", file=sys.stderr)
+
+    regions = pd.DataFrame({
+        "chrom": transcripts["chrom"].str.replace(r"^chr", "", regex=True) if strip_chr else transcripts["chrom"],
+        "start": (transcripts["txStart"] - padding).clip(lower=0),
+        "end": transcripts["txEnd"] + padding,
+        "name": transcripts["name2"] + ":" + transcripts["isoform"],
+    }).sort_values(["chrom", "start", "end"])
+
+    merged = []
+    for chrom, start, end, name in regions.itertuples(index=False):
+        if merged and merged[-1][0] == chrom and start <= merged[-1][2]:
+            merged[-1][2] = max(merged[-1][2], end)
+            merged[-1][3] += f",{name}"
+        else:
+            merged.append([chrom, start, end, name])
+    return pd.DataFrame(merged, columns=["chrom", "start", "end", "name"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a padded BED file of the transcripts in a gene→isoform mapping."
+    )
+    parser.add_argument(
+        "-m", "--isoforms", required=True,
+        help="JSON mapping or path to JSON file of gene to isoform IDs (same as extract_variants.py)"
+    )
+    parser.add_argument(
+        "-r", "--refgene", required=True,
+        help="ANNOVAR refGene table, e.g. humandb/hg38_refGene.txt"
+    )
+    parser.add_argument(
+        "-p", "--padding", type=int, default=5000,
+        help="Bases added on each side of every transcript (default: 5000)"
+    )
+    parser.add_argument(
+        "--strip-chr", action="store_true",
+        help="Write chromosome names without the 'chr' prefix (for VCFs that use 1, 2, ... X)"
+    )
+    parser.add_argument(
+        "-o", "--out", required=True,
+        help="Path of the BED file to write"
+    )
+    args = parser.parse_args()
+
+    desired_isoforms = load_isoforms(args.isoforms)
+    if not os.path.isfile(args.refgene):
+        print(f"Error: refGene table {args.refgene} not found.", file=sys.stderr)
+        sys.exit(1)
+
+    regions = target_regions(desired_isoforms, read_refgene(args.refgene), args.padding, args.strip_chr)
+    if regions.empty:
+        print("Error: none of the isoforms were found in the refGene table.", file=sys.stderr)
+        sys.exit(1)
+
+    regions.to_csv(args.out, sep="\t", header=False, index=False)
+    print(f"Wrote {len(regions)} regions ({(regions['end'] - regions['start']).sum()} bp) to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Description: Resumable driver for the count-variation pipeline with stage-level caching.
+#              Runs the same steps as count-variation.sh (ID annotation, monomorphic filter,
+#              ANNOVAR, PLINK import, genotype counts per cohort and the final merge), but
+#              records the hash of every stage's inputs and its parameters in a manifest and
+#              skips stages whose inputs and parameters have not changed. After adding a
+#              cohort, only that cohort is counted and the merge is redone.
+#
+# Example:
+#   python3 run_pipeline.py \
+#     --vcf genome_exome_redlat \
+#     --annovar /home/usr/bin/table_annovar.pl \
+#     --annovar-database /home/usr/bin/annovar/humandb/ \
+#     --cohorts cohorts-redlat.txt \
+#     --jobs 8
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from count_genotypes import (
+    count_genotypes, counts_table, membership_matrix, read_bim, read_cohorts, read_fam
+)
+from extract_variants import load_isoforms
+from isoforms_to_bed import read_refgene, target_regions
+
+
+# Bump a stage's version when its implementation changes to invalidate cached results
+STAGE_VERSIONS = {
+    "bgzip": 1,
+    "regions": 1,
+    "id_annotate": 1,
+    "monomorphic_filter": 1,
+    "annovar": 1,
+    "plink_import": 1,
+    "counts": 1,
+    "merge": 1,
+}
+
+
+class Pipeline:
+    """Runs stages and skips them when their recorded inputs and parameters are unchanged.
+
+    The manifest (a JSON file) keeps, for every stage, the sha256 of its input and
+    output files and its parameters. File hashes are also cached by path, size and
+    mtime so that large files are only hashed again when they change.
+    """
+
+    def __init__(self, manifest_path, force=False):
+        self.manifest_path = manifest_path
+        self.force = force
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"hashes": {}, "stages": {}}
+
+    def save(self):
+        # Write atomically so an interrupted run never leaves a truncated manifest
+        directory = os.path.dirname(os.path.abspath(self.manifest_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def file_hash(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        cached = self.manifest["hashes"].get(path)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self.manifest["hashes"][path] = {
+            "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest
+        }
+        return digest
+
+    def _hashes(self, paths):
+        return {os.path.abspath(p): self.file_hash(p) for p in paths}
+
+    def _params(self, name, params):
+        return dict(params, version=STAGE_VERSIONS[name.split(":")[0]])
+
+    def up_to_date(self, name, inputs, params, outputs):
+        params = self._params(name, params)
+        previous = self.manifest["stages"].get(name)
+        if self.force or previous is None:
+            return False
+        if previous["params"] != params or previous["inputs"] != self._hashes(inputs):
+            return False
+        if not all(os.path.exists(o) for o in outputs):
+            return False
+        return previous["outputs"] == self._hashes(outputs)
+
+    def run(self, name, inputs, params, outputs, action):
+        """Run action() unless the stage is up to date, then record it in the manifest."""
+        if self.up_to_date(name, inputs, params, outputs):
+            print(f"[{name}] up to date, skipping")
+            return False
+        print(f"[{name}] running...")
+        action()
+        self.manifest["stages"][name] = {
+            "inputs": self._hashes(inputs),
+            "params": self._params(name, params),
+            "outputs": self._hashes(outputs),
+        }
+        self.save()
+        return True
+
+
+# Run an external command, optionally redirecting its standard output to a file.
+
+def run_command(command, stdout_path=None):
+    print("  $ " + " ".join(command))
+    if stdout_path is None:
+        subprocess.run(command, check=True)
+        return
+    # Write to a temporary file so a failed command never leaves a partial output behind
+    tmp_path = f"{stdout_path}.tmp"
+    with open(tmp_path, "wb") as out:
+        subprocess.run(command, check=True, stdout=out)
+    os.replace(tmp_path, stdout_path)
+
+# Replace the header of the ANNOVAR table with its first 13 columns followed by the
+# '#CHROM' line (with the sample IDs) of the annotated VCF, as count-variation.sh does.
+
+def fix_annovar_header(table_path, vcf_path):
+    with open(vcf_path) as f:
+        chrom_line = next(line for line in f if line.startswith("#CHROM"))
+    tmp_path = f"{table_path}.tmp"
+    with open(table_path) as src, open(tmp_path, "w") as dst:
+        header = src.readline().rstrip("\n").replace(" ", "\t").split("\t")
+        dst.write("\t".join(header[:13] + chrom_line.rstrip("\n").split("\t")) + "\n")
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, table_path)
+
+# Worker for the parallel counting stage: counts one block of variants for the given groups.
+
+def count_block(bed_path, n_variants, membership, variant_range):
+    return count_genotypes(bed_path, n_variants, membership, variant_range=variant_range)
+
+# Count Hom_A1/Het/Hom_A2 (in .bim allele order) for the given groups, splitting the
+# variants between `jobs` processes. groups is a list of (name, set of sample IDs or None
+# for all samples). Returns {name: counts array of shape (n_variants, 3)}.
+
+def count_groups(plink_prefix, groups, jobs):
+    n_variants = len(read_bim(plink_prefix))
+    sample_ids = read_fam(plink_prefix)
+    cohorts = [(name, samples) for name, samples in groups if samples is not None]
+    membership = membership_matrix(sample_ids, cohorts)
+
+    bounds = np.linspace(0, n_variants, max(1, min(jobs, n_variants)) + 1).astype(int)
+    ranges = [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    bed_path = f"{plink_prefix}.bed"
+    if len(ranges) > 1:
+        with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+            blocks = list(pool.map(
+                count_block, [bed_path] * len(ranges), [n_variants] * len(ranges),
+                [membership] * len(ranges), ranges
+            ))
+        counts = np.concatenate(blocks)
+    else:
+        counts = count_genotypes(bed_path, n_variants, membership)
+
+    results = {}
+    column = {name: j for j, (name, _) in enumerate(cohorts, start=1)}
+    for name, samples in groups:
+        results[name] = counts[:, 0 if samples is None else column[name], :]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Annotate a VCF and count variant carriers per cohort, skipping stages whose inputs have not changed."
+    )
+    parser.add_argument("--vcf", required=True, help="Base path to the VCF file (without .vcf or .vcf.gz)")
+    parser.add_argument("--annovar", required=True, help="Path to ANNOVAR's table_annovar.pl")
+    parser.add_argument("--annovar-database", required=True, help="Path to the ANNOVAR database directory (humandb)")
+    parser.add_argument("--cohorts", help="File listing one cohort name per line (each with a file of sample IDs)")
+    parser.add_argument("--cohort-dir", default=".", help="Directory containing the per-cohort sample files")
+    parser.add_argument("--isoforms", help="Gene→isoform JSON mapping; restricts the analysis to those transcripts")
+    parser.add_argument("--region-padding", type=int, default=5000, help="Bases added around each transcript (default: 5000)")
+    parser.add_argument("--keep-allele-order", action="store_true", help="Keep A1/A2 as in the .bim file")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Processes used for genotype counting")
+    parser.add_argument("--manifest", help="Path of the stage manifest (default: <vcf>.pipeline-manifest.json)")
+    parser.add_argument("--force", action="store_true", help="Run every stage even if it is up to date")
+    args = parser.parse_args()
+
+    base = args.vcf
+    # refGene table of the ANNOVAR database, used for the target regions and the annotation
+    refgene = os.path.join(args.annovar_database, "hg38_refGene.txt")
+    refgene_mrna = os.path.join(args.annovar_database, "hg38_refGeneMrna.fa")
+    pipeline = Pipeline(args.manifest or f"{base}.pipeline-manifest.json", force=args.force)
+
+    ## 1. Locate the input VCF (compressed to a separate file so the input is never modified)
+    if os.path.isfile(f"{base}.vcf.gz") and os.path.getsize(f"{base}.vcf.gz") > 0:
+        vcf = f"{base}.vcf.gz"
+    elif os.path.isfile(f"{base}.vcf") and os.path.getsize(f"{base}.vcf") > 0:
+        vcf = f"{base}.bgz.vcf.gz"
+        pipeline.run("bgzip", [f"{base}.vcf"], {}, [vcf],
+                     lambda: run_command(["bgzip", "-c", f"{base}.vcf"], vcf))
+    else:
+        print(f"Error: No valid VCF file found at {base}.vcf or {base}.vcf.gz", file=sys.stderr)
+        sys.exit(1)
+
+    ## 1b. Optionally restrict the VCF to the padded transcripts of the target genes
+    if args.isoforms:
+        desired_isoforms = load_isoforms(args.isoforms)
+        regions_bed = f"{base}.regions.bed"
+        regions_vcf = f"{base}_regions.vcf.gz"
+
+        def restrict():
+            if not (os.path.exists(f"{vcf}.tbi") or os.path.exists(f"{vcf}.csi")):
+                run_command(["tabix", "-p", "vcf", vcf])
+            contigs = subprocess.run(["tabix", "-l", vcf], check=True, capture_output=True, text=True).stdout.split()
+            strip_chr = not any(contig.startswith("chr") for contig in contigs)
+            regions = target_regions(desired_isoforms, read_refgene(refgene), args.region_padding, strip_chr)
+            regions.to_csv(regions_bed, sep="\t", header=False, index=False)
+            run_command(["bcftools", "view", "--regions-file", regions_bed, "--output-type", "z", vcf], regions_vcf)
+
+        pipeline.run("regions", [vcf, refgene],
+                     {"isoforms": desired_isoforms, "padding": args.region_padding},
+                     [regions_vcf, regions_bed], restrict)
+        vcf = regions_vcf
+        base = f"{base}_regions"
+
+    ## 2. Assign variant identifiers and remove monomorphic variants
+    id_all_vcf = f"{base}_id.all.vcf.gz"
+    pipeline.run("id_annotate", [vcf], {}, [id_all_vcf], lambda: run_command(
+        ["bcftools", "annotate", "--set-id", "+%CHROM\\_%POS\\_%REF\\_%FIRST_ALT", "--output-type", "z", vcf],
+        id_all_vcf
+    ))
+
+    base = f"{base}_id"
+    id_vcf = f"{base}.vcf.gz"
+
+    def filter_monomorphic():
+        run_command(["bcftools", "view", "--min-ac", "1", "--output-type", "z", id_all_vcf], id_vcf)
+        run_command(["tabix", "-f", "-p", "vcf", id_vcf])
+
+    pipeline.run("monomorphic_filter", [id_all_vcf], {"min_ac": 1}, [id_vcf, f"{id_vcf}.tbi"], filter_monomorphic)
+
+    ## 3. Annotate with ANNOVAR and put the sample IDs in the table header
+    annovar_file = f"{base}.hg38_multianno"
+
+    def annotate():
+        run_command([
+            args.annovar, id_vcf, args.annovar_database,
+            "--buildver", "hg38", "--outfile", base, "--protocol", "refGene", "--operation", "g",
+            "--nastring", ".", "--vcfinput", "--remove"
+        ])
+        fix_annovar_header(f"{annovar_file}.txt", f"{annovar_file}.vcf")
+        run_command(["bgzip", "-f", f"{annovar_file}.vcf"])
+
+    # The refGene files are hashed, so an updated database invalidates the annotations
+    annovar_inputs = [id_vcf] + [path for path in (refgene, refgene_mrna) if os.path.isfile(path)]
+    annovar_params = {
+        "annovar": os.path.abspath(args.annovar),
+        "database": os.path.abspath(args.annovar_database),
+        "protocol": "refGene",
+    }
+    pipeline.run("annovar", annovar_inputs, annovar_params,
+                 [f"{annovar_file}.txt", f"{annovar_file}.vcf.gz"], annotate)
+
+    ## 4. Import the annotated VCF into PLINK
+    plink_file = f"{annovar_file}.plink"
+    plink_outputs = [f"{plink_file}.bed", f"{plink_file}.bim", f"{plink_file}.fam"]
+    pipeline.run("plink_import", [f"{annovar_file}.vcf.gz"], {}, plink_outputs, lambda: run_command([
+        "plink", "--vcf", f"{annovar_file}.vcf.gz", "--vcf-half-call", "m", "--allow-extra-chr",
+        "--double-id", "--keep-allele-order", "--make-bed", "--out", plink_file
+    ]))
+
+    ## 5. Count genotypes for all samples and each cohort; each cohort is cached separately
+    cohort_names = []
+    if args.cohorts and os.path.isfile(args.cohorts) and os.path.getsize(args.cohorts) > 0:
+        cohort_names = [name for name, _ in read_cohorts(args.cohorts, args.cohort_dir)]
+    counts_dir = f"{annovar_file}.counts"
+    os.makedirs(counts_dir, exist_ok=True)
+
+    def counts_path(name):
+        return os.path.join(counts_dir, f"{name}.tsv")
+
+    # (group name, file with its sample IDs or None for all samples)
+    groups = [("all", None)] + [(name, os.path.join(args.cohort_dir, name)) for name in cohort_names]
+
+    def group_inputs(sample_file):
+        return plink_outputs + ([sample_file] if sample_file else [])
+
+    pending = [
+        (name, sample_file) for name, sample_file in groups
+        if not pipeline.up_to_date(f"counts:{name}", group_inputs(sample_file), {}, [counts_path(name)])
+    ]
+    results = {}
+    if pending:
+        print(f"Counting genotypes for {', '.join(name for name, _ in pending)} using {args.jobs} processes...")
+        samples = dict(read_cohorts(args.cohorts, args.cohort_dir)) if cohort_names else {}
+        results = count_groups(
+            plink_file, [(name, samples[name] if sample_file else None) for name, sample_file in pending], args.jobs
+        )
+
+    def write_counts(name):
+        pd.DataFrame(results[name], columns=["Hom_A1", "Het", "Hom_A2"]).to_csv(
+            counts_path(name), sep="\t", index=False
+        )
+
+    for name, sample_file in groups:
+        pipeline.run(f"counts:{name}", group_inputs(sample_file), {}, [counts_path(name)],
+                     lambda name=name: write_counts(name))
+
+    ## 6. Merge annotations and genotype counts
+    merged_path = f"{annovar_file}.annotated-variant-counts.tsv"
+
+    def merge():
+        bim = read_bim(plink_file)
+        counts = np.stack([
+            pd.read_csv(counts_path(name), sep="\t").to_numpy() for name, _ in groups
+        ], axis=1)
+        table = counts_table(bim, counts, cohort_names, args.keep_allele_order)
+        table.to_csv(f"{annovar_file}.cohort-counts.txt", sep="\t", index=False)
+        # Annotation columns 1–10 and the variant ID (column 16), as count-variation.sh extracts them
+        annotations = pd.read_table(f"{annovar_file}.txt", usecols=list(range(10)) + [15], low_memory=False)
+        merged = pd.merge(annotations, table, on="ID", how="left")
+        merged.to_csv(merged_path, sep="\t", index=False)
+
+    pipeline.run("merge", [f"{annovar_file}.txt", f"{plink_file}.bim"] + [counts_path(name) for name, _ in groups],
+                 {"cohorts": cohort_names, "keep_allele_order": args.keep_allele_order},
+                 [merged_path, f"{annovar_file}.cohort-counts.txt"], merge)
+
+    print(f"Annotated variants and their respective allele counts are in: {merged_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""Parsing and caching of the per-gene variant tables under ``data/<dataset>/``.
+
+Each gene file is parsed once into a typed, AA-sorted DataFrame plus its exon
+ranges. Parsed tables are kept in a shared LRU cache keyed by file path and
+invalidated whenever the file's mtime or size changes.
+
+A dataset can also be stored as a consolidated Arrow file next to its directory
+(``data/<dataset>.arrow``, see data_preprocessing/build_variant_store.py). When
+it contains a gene and is not older than that gene's TSV file, the gene is read
+from the memory-mapped store instead of the TSV.
+
+pandas and pyarrow are imported on first use, so that importing the app does
+not load them.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import metrics
+
+
+# A parsed gene file: variants sorted by AA position, the min/max AA per exon and
+# the sha256 of the raw file contents.
+# Cached tables are shared between callbacks and must not be modified in place.
+GeneTable = namedtuple("GeneTable", ["variants", "exon_ranges", "digest", "nbytes"])
+
+
+# Suffix of the consolidated store of a dataset directory and the schema metadata
+# key of its gene index (must match data_preprocessing/build_variant_store.py)
+STORE_SUFFIX = ".arrow"
+GENE_INDEX_KEY = b"gene_index"
+
+
+def read_gene_table(file_path):
+    """Read a gene file and return it as a GeneTable."""
+    import pandas as pd
+    with open(file_path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    return prepare_gene_table(pd.read_csv(io.BytesIO(raw), sep="\t"), digest)
+
+
+def prepare_gene_table(variants, digest):
+    """Drop variants without an AA position, sort by AA and compute the exon ranges."""
+    import pandas as pd
+    variants["AA"] = pd.to_numeric(variants["AA"], errors="coerce")
+    variants = variants.dropna(subset=["AA"])
+    variants = variants.sort_values("AA").reset_index(drop=True)
+    exon_ranges = variants.groupby("exon")["AA"].agg(["min", "max"]).reset_index()
+    nbytes = int(variants.memory_usage(deep=True).sum() + exon_ranges.memory_usage(deep=True).sum())
+    return GeneTable(variants, exon_ranges, digest, nbytes)
+
+
+class VariantStore:
+    """Memory-mapped consolidated store of all gene tables of one dataset."""
+
+    def __init__(self, path):
+        pa = import_pyarrow()
+        self.path = path
+        # Reading the IPC file from a memory map does not copy the column buffers
+        self.table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        self.index = json.loads(self.table.schema.metadata[GENE_INDEX_KEY])
+
+    def genes(self):
+        return sorted(self.index)
+
+    def __contains__(self, gene):
+        return gene in self.index
+
+    def read(self, gene):
+        """Return the GeneTable of one gene."""
+        entry = self.index[gene]
+        variants = (
+            self.table.slice(entry["offset"], entry["length"])
+            .select(entry["columns"])
+            .to_pandas()
+        )
+        return prepare_gene_table(variants, entry["sha256"])
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def store_path_for(dataset_dir):
+    """Return the path of the consolidated store of a dataset directory."""
+    return os.path.normpath(os.path.abspath(dataset_dir)) + STORE_SUFFIX
+
+
+def import_pyarrow():
+    """Return the pyarrow module, or None if it is not installed.
+
+    The consolidated store is optional; TSV files always work without pyarrow.
+    """
+    try:
+        import pyarrow as pa
+        # pa.ipc is only available once the submodule is imported
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        return None
+    return pa
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def open_store(path):
+    """Return the VariantStore at path (reopened when the file changes), or None."""
+    stat = _stat(path)
+    if stat is None or import_pyarrow() is None:
+        return None
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _stores_lock:
+        cached = _stores.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+    store = VariantStore(path)
+    with _stores_lock:
+        _stores[path] = (signature, store)
+    return store
+
+
+def gene_source(file_path):
+    """Locate a gene file in its dataset's store or as a TSV file.
+
+    Returns (signature, load) where signature changes whenever the data changes
+    and load() returns the GeneTable, or None if the gene does not exist.
+    """
+    file_path = os.path.abspath(file_path)
+    dataset_dir, gene = os.path.split(file_path)
+    tsv_stat = _stat(file_path)
+    if tsv_stat is not None and not os.path.isfile(file_path):
+        tsv_stat = None
+    store_path = store_path_for(dataset_dir)
+    store_stat = _stat(store_path)
+    if store_stat is not None and (tsv_stat is None or store_stat.st_mtime_ns >= tsv_stat.st_mtime_ns):
+        store = open_store(store_path)
+        if store is not None and gene in store:
+            signature = ("store", store_stat.st_mtime_ns, store_stat.st_size)
+            return signature, lambda: store.read(gene)
+    if tsv_stat is not None:
+        return ("tsv", tsv_stat.st_mtime_ns, tsv_stat.st_size), lambda: read_gene_table(file_path)
+    return None
+
+
+def gene_exists(file_path):
+    return gene_source(file_path) is not None
+
+
+def gene_digest(file_path):
+    """Return the sha256 of a gene's TSV contents without parsing it, or None if it does not exist.
+
+    This is the digest of the GeneTable that get() would return for file_path.
+    """
+    source = gene_source(file_path)
+    if source is None:
+        return None
+    if source[0][0] == "store":
+        dataset_dir, gene = os.path.split(os.path.abspath(file_path))
+        return open_store(store_path_for(dataset_dir)).index[gene]["sha256"]
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_genes(dataset_dir):
+    """Return the sorted gene file names of a dataset, from its directory and its store."""
+    genes = set()
+    if os.path.isdir(dataset_dir):
+        genes.update(
+            f for f in os.listdir(dataset_dir)
+            if not f.startswith(".") and os.path.isfile(os.path.join(dataset_dir, f))
+        )
+    store = open_store(store_path_for(dataset_dir))
+    if store is not None:
+        genes.update(store.genes())
+    return sorted(genes)
+
+
+class GeneTableCache:
+    """LRU cache of parsed gene tables with a total memory budget.
+
+    Entries are keyed by the absolute file path and remember the mtime and size
+    of the file (or dataset store) they were read from, so edited or replaced
+    data is read again on the next lookup. Tables larger than the whole budget are returned
+    but never cached.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, file_path):
+        """Return the GeneTable for file_path, parsing the file on a miss."""
+        key = os.path.abspath(file_path)
+        source = gene_source(key)
+        if source is None:
+            raise FileNotFoundError(file_path)
+        signature, load = source
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        with metrics.phase("parse"):
+            table = load()
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1].nbytes
+            if table.nbytes <= self.max_bytes:
+                self._entries[key] = (signature, table)
+                self._size += table.nbytes
+                while self._size > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self._size -= evicted.nbytes
+                    self.evictions += 1
+        return table
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """Return the hit/miss counters and current memory use of the cache."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,244 @@
+"""Request timings and cache statistics in the Prometheus text format.
+
+Code under measurement times its phases (parsing a gene file, clustering,
+drawing, savefig, base64 encoding...) with ``phase()`` or a ``Stopwatch``.
+Every phase is recorded in the ``phase_seconds`` histogram and, when the
+thread is handling a request (between ``begin()`` and ``end()``), in that
+request's trace, which the app can send back as a Server-Timing header or log.
+Callbacks wrapped with ``instrument()`` are timed as a whole as well.
+
+Metrics are kept in memory per process and rendered by ``Registry.render()``
+for a ``/metrics`` route. With several gunicorn workers each worker reports its
+own numbers.
+"""
+
+import bisect
+import functools
+import math
+import threading
+import time
+
+
+PREFIX = "variant_visualizer_"
+
+# Histogram buckets (upper bounds) for durations in seconds and payloads in bytes
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(10))
+
+_local = threading.local()
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    type = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, tuple(zip(self.labels, key)), value
+
+
+class Histogram:
+    """Cumulative histogram of observed values, optionally split by labels."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=TIME_BUCKETS):
+        self.name = PREFIX + name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (the last one is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        # A value equal to a bound belongs to that bucket ("le")
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bucket] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            labels = tuple(zip(self.labels, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                yield self.name + "_bucket", labels + (("le", format_value(bound)),), cumulative
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, count
+
+
+class Sampled:
+    """Counter or gauge whose values are read from another object when scraped.
+
+    fn() returns a number, or a list of (labels dict, number) pairs.
+    """
+
+    def __init__(self, name, type, help, fn):
+        self.name = PREFIX + name
+        self.type = type
+        self.help = help
+        self.fn = fn
+
+    def samples(self):
+        values = self.fn()
+        if not isinstance(values, list):
+            values = [({}, values)]
+        for labels, value in values:
+            yield self.name, tuple(labels.items()), value
+
+
+class Registry:
+    """The metrics reported by one process."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+PHASE_SECONDS = REGISTRY.register(Histogram(
+    "phase_seconds", "Time spent in each phase of handling a request.", ["phase"]
+))
+CALLBACK_SECONDS = REGISTRY.register(Histogram(
+    "callback_seconds", "Time spent in each instrumented callback or route.", ["callback"]
+))
+PAYLOAD_BYTES = REGISTRY.register(Histogram(
+    "payload_bytes", "Size of the responses of instrumented callbacks and routes.", ["callback"], SIZE_BUCKETS
+))
+
+
+def begin():
+    """Start collecting the phases timed in this thread, e.g. for one request."""
+    _local.trace = []
+    _local.callback = None
+    _local.start = time.perf_counter()
+
+
+def end():
+    """Stop collecting and return (instrumented callback or None, total seconds, [(phase, seconds)])."""
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        return None, 0.0, []
+    elapsed = time.perf_counter() - _local.start
+    callback = _local.callback
+    _local.trace = _local.callback = None
+    return callback, elapsed, trace
+
+
+def add(phases):
+    """Add phases timed in another thread (e.g. a render worker) to this thread's trace."""
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.extend(phases)
+
+
+def record(name, seconds):
+    PHASE_SECONDS.observe(seconds, phase=name)
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.append((name, seconds))
+
+
+class phase:
+    """Context manager timing one phase: ``with metrics.phase("parse"): ...``"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+
+
+class Stopwatch:
+    """Times consecutive phases: each lap(name) records the time since the previous lap."""
+
+    def __init__(self):
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        record(name, now - self.last)
+        self.last = now
+
+
+def instrument(name):
+    """Decorator timing a callback or route as a whole, under callback=name."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, "trace", None) is not None:
+                _local.callback = name
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                CALLBACK_SECONDS.observe(time.perf_counter() - start, callback=name)
+        return wrapper
+    return decorator
+
+
+def server_timing(trace, total):
+    """Return a Server-Timing header value for a request trace; repeated phases are summed."""
+    durations = {}
+    for name, seconds in trace:
+        durations[name] = durations.get(name, 0.0) + seconds
+    durations["total"] = total
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items())
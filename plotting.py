@@ -0,0 +1,190 @@
+"""Drawing of the lollipop plots, shared by the app and render_static.py.
+
+build_figure draws the plot of one gene and cohort on a standalone matplotlib
+Figure (no pyplot global state, so it is safe to use from several threads) and
+render_plot saves it as PNG, SVG or WebP. plot_data returns the same clusters
+as JSON for the interactive plot drawn in the browser.
+"""
+
+import io
+import math
+
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+import numpy as np
+
+import metrics
+from clustering import cluster_variants
+from variant_index import counts
+
+
+# Formats render_plot can write and their MIME types
+FORMATS = {"png": "image/png", "svg": "image/svg+xml", "webp": "image/webp"}
+
+def build_figure(variants, exon_ranges, cohort, title, legend, aa_window=None,
+                 cluster_distance=10, detail_max_variants=200, overview_bins=200, overview_labels=10):
+    """Draw the lollipop plot of one gene and cohort and return the Figure.
+
+    aa_window=(start, end) restricts the plot to those AA positions (default:
+    all). When the clusters with carriers in the window hold more than
+    detail_max_variants variants, carriers are drawn as overview_bins density
+    bars with the overview_labels variants with most carriers labelled.
+    """
+    stopwatch = metrics.Stopwatch()
+    fig = Figure(figsize=(12, 4), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    x_start, x_end = aa_window if aa_window is not None else (0, variants["AA"].max() + 50)
+    # Variants are sorted by AA, so the window is a slice; only it is clustered and drawn
+    first = variants["AA"].searchsorted(x_start, side="left")
+    last = variants["AA"].searchsorted(x_end, side="right")
+    window = variants.iloc[first:last]
+    clusters = cluster_variants(window, cohort, cluster_distance)
+    # Only clusters with at least one carrier in the cohort are drawn
+    clusters = clusters[clusters["carriers"] > 0]
+    stopwatch.lap("cluster")
+    if clusters["size"].sum() <= detail_max_variants:
+        draw_clusters(ax, clusters)
+        y_label = "Carriers (Homozygous/Heterozygous)"
+    else:
+        bin_width = draw_carrier_density(ax, window, cohort, x_start, x_end, overview_bins, overview_labels)
+        y_label = f"Carriers per {bin_width} amino acids"
+    exon_y = -0.08
+    exon_height = 0.005
+    ax.fill_between(
+        [1, variants["AA"].max() + 50],
+        exon_y - exon_height / 2,
+        exon_y + exon_height / 2,
+        color="lightgray",
+        zorder=0
+    )
+    colors = matplotlib.colormaps["Paired"].colors
+    exon_legend = {}
+    for i, (_, exon) in enumerate(exon_ranges.iterrows()):
+        exon_color = colors[i % len(colors)]
+        min_width = 5
+        exon_start, exon_end = exon["min"], exon["max"]
+        if exon_end - exon_start < min_width:
+            exon_start -= min_width / 2
+            exon_end += min_width / 2
+        ax.hlines(exon_y, exon_start, exon_end, colors=exon_color, linewidth=6, label=exon["exon"], zorder=1)
+        if exon_end >= x_start and exon_start <= x_end:
+            exon_legend[exon["exon"]] = exon_color
+    ax.set_xlim(x_start, x_end)
+    ax.set_ylim(-0.1, 0.25)
+    ax.set_xlabel("Amino Acid Position", fontsize=12)
+    ax.set_ylabel(y_label, fontsize=8)
+    ax.set_yticks([])
+    ax.spines["top"].set_visible(False)
+    ax.spines["right"].set_visible(False)
+    ax.spines["left"].set_visible(False)
+    handles = [Line2D([0], [0], color=color, linewidth=5, label=exon) for exon, color in exon_legend.items()]
+    ax.legend(handles=handles, title="Exons", loc="center left", bbox_to_anchor=(1.01, 0.5), fontsize=8)
+    ax.set_title(title, fontsize=14)
+    if legend is not None:
+        fig.text(
+            0.5,
+            -0.1,
+            legend,
+            wrap=True,
+            ha="center",
+            fontsize=8
+        )
+    stopwatch.lap("draw")
+    return fig
+
+
+def render_figure(fig, fmt="png"):
+    """Save a Figure built by build_figure as PNG (300 dpi), SVG or WebP bytes."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unsupported format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    buf = io.BytesIO()
+    # No creation date in SVGs, so that identical plots give identical files
+    metadata = {"Date": None} if fmt == "svg" else None
+    with metrics.phase("savefig"):
+        fig.savefig(buf, format=fmt, bbox_inches="tight", dpi=300, metadata=metadata)
+    return buf.getvalue()
+
+
+def render_plot(variants, exon_ranges, cohort, title, legend, aa_window=None, fmt="png", **options):
+    """Build the plot of one gene and cohort and return it as bytes in fmt."""
+    return render_figure(build_figure(variants, exon_ranges, cohort, title, legend, aa_window, **options), fmt)
+
+
+def draw_clusters(ax, clusters):
+    # One lollipop per cluster: a stem, a stack of one dot per variant and the label
+    # with the carrier counts. Stems and dots of all clusters are drawn in one call each
+    base_y = -0.07
+    y = -0.03
+    color = "black"
+    x = clusters["x"].to_numpy(dtype=float)
+    size = clusters["size"].to_numpy(dtype=int)
+    if len(x) == 0:
+        return
+    ax.vlines(x, base_y, y, color=color, linewidth=1)
+    # The i-th dot of a cluster is drawn i * 0.005 below the top of the stem
+    stack = np.arange(size.sum()) - np.repeat(np.cumsum(size) - size, size)
+    ax.scatter(np.repeat(x, size), y - stack * 0.005, color=color, s=10, zorder=3)
+    for cluster_x, cluster_size, label in zip(x, size, clusters["label"]):
+        ax.text(cluster_x, y + cluster_size * 0.003 + 0.01, label, rotation=90, ha="center", fontsize=8, color=color)
+
+
+def draw_carrier_density(ax, variants, cohort, x_start, x_end, overview_bins, overview_labels):
+    # Overview of a dense window: carriers summed in overview_bins equal-width AA bins,
+    # drawn as bars scaled to the fullest bin, with the overview_labels variants with
+    # most carriers labelled on top of their bar. Returns the bin width in amino acids
+    base_y = -0.07
+    top_y = 0.12
+    color = "black"
+    bin_width = max(1, math.ceil((x_end - x_start) / overview_bins))
+    hom = counts(variants, f"{cohort}.Hom_A1")
+    het = counts(variants, f"{cohort}.Het")
+    carriers = hom + het
+    aa = variants["AA"].to_numpy(dtype=float)
+    visible = np.flatnonzero((carriers > 0) & (aa >= x_start) & (aa <= x_end))
+    bins = ((aa[visible] - x_start) // bin_width).astype(int)
+    totals = np.bincount(bins, weights=carriers[visible])
+    filled = np.flatnonzero(totals)
+    heights = (top_y - base_y) * totals[filled] / totals.max()
+    ax.bar(x_start + (filled + 0.5) * bin_width, heights, width=bin_width * 0.8, bottom=base_y, color=color, zorder=2)
+
+    # Label the variants with most carriers, skipping any closer than min_gap bins to
+    # an already labelled one so that the labels do not overlap
+    min_gap = max(1, overview_bins // (2 * overview_labels))
+    labelled = []
+    order = np.argsort(-carriers[visible], kind="stable")
+    for row, b in zip(visible[order], bins[order]):
+        if len(labelled) == overview_labels:
+            break
+        if all(abs(b - other) >= min_gap for _, other in labelled):
+            labelled.append((row, b))
+    for row, b in labelled:
+        height = (top_y - base_y) * totals[b] / totals.max()
+        ax.text(x_start + (b + 0.5) * bin_width, base_y + height + 0.01,
+                f"{variants['variant'].iat[row]} ({hom[row]} / {het[row]})",
+                rotation=90, ha="center", fontsize=8, color=color)
+    return bin_width
+
+
+def plot_data(variants, exon_ranges, cohort, title, legend, cluster_distance=10):
+    # Compact JSON-serialisable description of a plot for the interactive mode:
+    # only the clusters with carriers and the exon ranges are sent to the browser
+    clusters = cluster_variants(variants, cohort, cluster_distance)
+    clusters = clusters[clusters["carriers"] > 0]
+    return {
+        "title": title,
+        "legend": legend,
+        "xmax": float(variants["AA"].max() + 50) if not variants.empty else 50.0,
+        "clusters": {
+            "x": clusters["x"].astype(float).tolist(),
+            "size": clusters["size"].astype(int).tolist(),
+            "label": clusters["label"].tolist(),
+        },
+        "exons": {
+            "exon": [str(exon) for exon in exon_ranges["exon"]],
+            "start": exon_ranges["min"].astype(float).tolist(),
+            "end": exon_ranges["max"].astype(float).tolist(),
+        },
+    }
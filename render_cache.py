@@ -0,0 +1,183 @@
+"""Two-tier cache of rendered plot images.
+
+Rendered images are kept in an in-memory LRU and, optionally, in a directory of
+content-addressed files on disk. Keys are derived from everything the image
+depends on (gene file contents, dataset, cohort and the title/legend text), so
+an entry can never be served for data it was not rendered from and the disk
+directory can be cleared at any time.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+# Bump this whenever the plot drawing code changes so old images are not reused
+RENDER_VERSION = "1"
+
+
+def render_key(gene_digest, dataset, cohort, title, legend, fmt="png", **options):
+    """Return the content-addressed cache key for one rendered plot.
+
+    Extra keyword options (e.g. cluster_distance) are part of the key as well.
+    """
+    h = hashlib.sha256()
+    parts = [RENDER_VERSION, gene_digest, dataset, cohort, title, legend or "", fmt]
+    parts += [f"{name}={options[name]}" for name in sorted(options)]
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def write_atomic(path, data):
+    """Write bytes to path through a temporary file, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class RenderCache:
+    """In-memory LRU of rendered images backed by an optional disk directory.
+
+    With disk_max_bytes, the least recently used files are deleted whenever the
+    directory grows beyond that size (down to 90% of it, so that not every write
+    triggers a scan). Several processes may share the directory; each one
+    rescans it before deleting anything.
+    """
+
+    def __init__(self, max_bytes, cache_dir=None, extension="png", disk_max_bytes=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.extension = extension
+        self.disk_max_bytes = disk_max_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        # Estimated size of the disk directory; scanned on the first write
+        self._disk_size = None
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{self.extension}")
+
+    def _remember(self, key, data):
+        # Caller must hold the lock
+        if len(data) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= len(old)
+        self._entries[key] = data
+        self._size += len(data)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def get(self, key):
+        """Return the cached image bytes for key, or None."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return data
+        if self.cache_dir:
+            try:
+                with open(self._disk_path(key), "rb") as f:
+                    data = f.read()
+            except OSError:
+                data = None
+            if data is not None:
+                if self.disk_max_bytes is not None:
+                    # Recently used files are the last to be pruned
+                    try:
+                        os.utime(self._disk_path(key))
+                    except OSError:
+                        pass
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, data)
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data):
+        """Store image bytes under key in memory and on disk."""
+        with self._lock:
+            self._remember(key, data)
+        if self.cache_dir:
+            try:
+                write_atomic(self._disk_path(key), data)
+            except OSError:
+                return
+            if self.disk_max_bytes is not None:
+                self._account_disk(len(data))
+
+    def _disk_files(self):
+        # (mtime, size, path) of every cached file
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith("." + self.extension):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _account_disk(self, nbytes):
+        with self._disk_lock:
+            if self._disk_size is None:
+                self._disk_size = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_size += nbytes
+            if self._disk_size > self.disk_max_bytes:
+                self.prune_disk(int(self.disk_max_bytes * 0.9))
+
+    def prune_disk(self, target_bytes):
+        """Delete the least recently used files until the disk directory holds at most target_bytes."""
+        files = sorted(self._disk_files())
+        size = sum(size for _, size, _ in files)
+        for _, file_size, path in files:
+            if size <= target_bytes:
+                break
+            try:
+                os.remove(path)
+                self.disk_evictions += 1
+            except OSError:
+                # Already removed by another process
+                pass
+            size -= file_size
+        self._disk_size = size
+
+    def stats(self):
+        """Return the hit/miss counters and current memory use of the cache."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "disk_bytes": self._disk_size,
+                "disk_max_bytes": self.disk_max_bytes,
+                "disk_evictions": self.disk_evictions,
+            }
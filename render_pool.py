@@ -0,0 +1,96 @@
+"""Bounded worker pool for plot rendering.
+
+Renders run on a fixed number of worker threads (or processes) with a limit on
+how many may be waiting, so a burst of slow renders cannot pile up without
+bound. Requests for a plot that is already being rendered wait for that render
+instead of starting a new one.
+"""
+
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+class RenderQueueFull(Exception):
+    """Raised when too many renders are already running or waiting."""
+
+
+class RenderTimeout(Exception):
+    """Raised when a render does not finish within the allowed time."""
+
+
+class RenderPool:
+    """Runs render functions on a bounded pool, coalescing identical requests.
+
+    At most max_workers renders run at once and at most max_queue more wait
+    for a worker; further requests raise RenderQueueFull. With use_processes
+    the functions and their arguments must be picklable.
+    """
+
+    def __init__(self, max_workers, max_queue, use_processes=False):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        if use_processes:
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="render")
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        """Start fn(*args) for key, or return the future of the render already running for key."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            if len(self._in_flight) >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise RenderQueueFull(
+                    f"{len(self._in_flight)} renders are already running or queued"
+                )
+            future = self._executor.submit(fn, *args)
+            self._in_flight[key] = future
+            self.submitted += 1
+        # Added outside the lock: the callback runs immediately if the render already finished
+        future.add_done_callback(lambda done: self._finished(key, done))
+        return future
+
+    def _finished(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def run(self, key, fn, *args, timeout=None):
+        """Render through the pool and wait for the result for at most timeout seconds."""
+        future = self.submit(key, fn, *args)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            # The render keeps running and later requests for the same key can still use it
+            raise RenderTimeout(f"render did not finish within {timeout} seconds")
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._in_flight)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._in_flight),
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,231 @@
+"""Render the plots of every dataset, gene and cohort ahead of time.
+
+    python render_static.py --out static_plots --formats png,svg,webp --workers 8
+
+Every plot is written as ``<out>/<key[:2]>/<key>.<format>``, where key is the
+content-addressed render key the app uses for the same plot, and listed in
+``<out>/manifest.json`` under ``<dataset>/<gene>/<cohort>``. Runs are
+incremental: a plot whose key did not change and whose file exists is not
+rendered again, so after editing one gene file only that gene is redrawn.
+Genes are rendered in parallel worker processes; each gene table is read once
+and each figure is drawn once and saved in every requested format.
+
+The app serves PNGs listed in the manifest instead of rendering them
+(StaticPlots), and the directory can be published as is on a static host or
+CDN (see static_plot_url in app.py).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from gene_tables import gene_digest, gene_source
+from render_cache import RENDER_VERSION, write_atomic
+
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def plot_file(key, fmt):
+    """Return the path of a rendered plot relative to the bundle directory."""
+    return f"{key[:2]}/{key}.{fmt}"
+
+
+def load_manifest(out_dir):
+    """Return the manifest of a bundle directory, or None if there is none."""
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+class StaticPlots:
+    """Lookup of pre-rendered plots by render key, reloaded when the manifest changes."""
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.hits = 0
+        self._files = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _reload(self):
+        try:
+            mtime = os.stat(os.path.join(self.out_dir, MANIFEST_NAME)).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        files = {}
+        manifest = load_manifest(self.out_dir) if mtime is not None else None
+        if manifest is not None:
+            for plot in manifest["plots"].values():
+                for path in plot["files"].values():
+                    files[os.path.splitext(os.path.basename(path))[0]] = path
+        with self._lock:
+            self._files, self._mtime = files, mtime
+
+    def path(self, key):
+        """Return the path of the plot with this key relative to out_dir, or None."""
+        self._reload()
+        return self._files.get(key)
+
+    def get(self, key):
+        """Return the bytes of the plot with this key, or None if it is not in the bundle."""
+        path = self.path(key)
+        if path is None:
+            return None
+        try:
+            with open(os.path.join(self.out_dir, path), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        self.hits += 1
+        return data
+
+
+def render_gene(file_path, out_dir, plots, options):
+    """Render the plots of one gene file in a worker process.
+
+    plots is a list of (cohort, title, legend, {format: path relative to out_dir}).
+    Returns the number of files written.
+    """
+    from plotting import build_figure, render_figure
+    source = gene_source(file_path)
+    if source is None:
+        return 0
+    table = source[1]()
+    written = 0
+    for cohort, title, legend, files in plots:
+        fig = build_figure(table.variants, table.exon_ranges, cohort, title, legend, **options)
+        for fmt, path in files.items():
+            write_atomic(os.path.join(out_dir, path), render_figure(fig, fmt))
+            written += 1
+    return written
+
+
+def plan(app, out_dir, formats, datasets, force):
+    """Return (manifest plots, render jobs) for the current data.
+
+    Plots whose file is already in out_dir are reused unless force is set.
+    """
+    plots = {}
+    jobs = []
+    for dataset in datasets:
+        for gene in app.catalog.genes(dataset):
+            entry = app.catalog.gene(dataset, gene)
+            file_path = os.path.join(app.data_dir, dataset, gene)
+            digest = gene_digest(file_path)
+            if entry is None or digest is None:
+                continue
+            todo = []
+            for cohort in entry.cohorts:
+                title, legend = app.plot_text(dataset, cohort)
+                files = {fmt: plot_file(app.plot_render_key(digest, dataset, cohort, fmt=fmt), fmt) for fmt in formats}
+                plots[f"{dataset}/{gene}/{cohort}"] = {"gene_sha256": digest, "files": files}
+                missing = {
+                    fmt: path for fmt, path in files.items()
+                    if force or not os.path.exists(os.path.join(out_dir, path))
+                }
+                if missing:
+                    todo.append((cohort, title, legend, missing))
+            if todo:
+                jobs.append((file_path, todo))
+    return plots, jobs
+
+
+def prune(out_dir, plots, candidates=None):
+    """Remove rendered files that are no longer listed in the manifest; returns how many.
+
+    With candidates (paths relative to out_dir), only those files may be removed.
+    """
+    keep = {path for plot in plots.values() for path in plot["files"].values()}
+    removed = 0
+    for root, _, names in os.walk(out_dir):
+        for name in names:
+            path = os.path.relpath(os.path.join(root, name), out_dir).replace(os.sep, "/")
+            if path == MANIFEST_NAME or path in keep or (candidates is not None and path not in candidates):
+                continue
+            os.remove(os.path.join(root, name))
+            removed += 1
+    return removed
+
+
+def main():
+    # plotting (matplotlib) is only imported where plots are drawn, so that the app can use
+    # StaticPlots without loading it
+    from plotting import FORMATS
+    parser = argparse.ArgumentParser(description="Pre-render every plot into a static bundle.")
+    parser.add_argument("--out", default="static_plots", help="Output directory (default: static_plots)")
+    parser.add_argument("--formats", default="png", help=f"Comma-separated formats among {', '.join(FORMATS)} (default: png)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (default: one per CPU)")
+    parser.add_argument("--dataset", action="append", help="Only render this dataset (repeatable)")
+    parser.add_argument("--force", action="store_true", help="Render every plot again, even if its file exists")
+    parser.add_argument("--prune", action="store_true", help="Delete files of plots that are no longer in the data")
+    args = parser.parse_args()
+
+    formats = [fmt.strip().lower() for fmt in args.formats.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown or not formats:
+        parser.error(f"unsupported format(s) {', '.join(unknown)}; choose among {', '.join(FORMATS)}")
+
+    # Titles, legends, drawing settings and cache keys come from the app configuration
+    import app
+    app.create_app()
+
+    datasets = app.catalog.datasets()
+    if args.dataset:
+        datasets = [name for name in datasets if name in args.dataset]
+
+    start = time.perf_counter()
+    plots, jobs = plan(app, args.out, formats, datasets, args.force)
+    files = sum(len(fmts) for _, todo in jobs for *_, fmts in todo)
+    print(f"{len(plots)} plots in {len(datasets)} datasets; rendering {files} files for {len(jobs)} genes")
+    candidates = None
+    if args.dataset:
+        # Only the selected datasets are replaced; the others keep their manifest entries
+        # and files
+        previous = load_manifest(args.out) or {"plots": {}}
+        candidates = set()
+        for name, plot in previous["plots"].items():
+            if name.split("/", 1)[0] in args.dataset:
+                candidates.update(plot["files"].values())
+            else:
+                plots.setdefault(name, plot)
+
+    written = 0
+    if jobs:
+        # Fresh worker processes, so they do not inherit the app's background threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max(1, args.workers), mp_context=context) as pool:
+            futures = {
+                pool.submit(render_gene, file_path, args.out, todo, app.plot_options): file_path
+                for file_path, todo in jobs
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                written += future.result()
+                print(f"[{done}/{len(jobs)}] {futures[future]}")
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "render_version": RENDER_VERSION,
+        "formats": formats,
+        "plots": plots,
+    }
+    write_atomic(os.path.join(args.out, MANIFEST_NAME), json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+    removed = prune(args.out, plots, candidates) if args.prune else 0
+    print(f"Wrote {written} files ({removed} removed) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Inverted index for searching variants across every dataset.
+
+Every variant of every gene file is indexed under its protein change (E280A),
+its AA position (280) and its gene symbol (PSEN1), with the Hom_A1/Het counts of
+every cohort. Keys are kept in a sorted list, so a query term matches all keys
+starting with it with two binary searches; a query of several terms
+(``PSEN1 E280``) returns the variants matching all of them.
+
+The index is built from the catalog and updated incrementally: only gene files
+whose size or mtime changed are read again.
+"""
+
+import bisect
+import os
+import threading
+from collections import namedtuple
+
+from catalog import header_cohorts
+from gene_tables import gene_source
+from variant_index import counts
+
+
+# One indexed variant; counts maps each cohort to (Hom_A1, Het)
+SearchHit = namedtuple("SearchHit", ["dataset", "gene", "variant", "AA", "exon", "counts"])
+
+
+def normalize(term):
+    return term.strip().upper()
+
+
+def read_hits(dataset, gene, table):
+    """Return the SearchHits and their index keys for one parsed gene table."""
+    variants = table.variants
+    cohort_counts = {
+        cohort: (counts(variants, f"{cohort}.Hom_A1"), counts(variants, f"{cohort}.Het"))
+        for cohort in header_cohorts(variants.columns)
+    }
+    symbol = gene.split(":")[0]
+    hits = []
+    for row, (variant, aa, exon) in enumerate(zip(variants["variant"].astype(str), variants["AA"], variants["exon"])):
+        hit = SearchHit(
+            dataset, gene, variant, int(aa), str(exon),
+            {cohort: (int(hom[row]), int(het[row])) for cohort, (hom, het) in cohort_counts.items()},
+        )
+        hits.append((hit, {normalize(variant), str(int(aa)), normalize(symbol)}))
+    return hits
+
+
+class SearchIndex:
+    """Prefix-searchable index of the variants of all datasets."""
+
+    def __init__(self):
+        # key -> set of hit ids; hit id -> SearchHit; (dataset, gene) -> (signature, [(hit id, keys)])
+        self._postings = {}
+        self._hits = {}
+        self._files = {}
+        self._keys = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+
+    def update(self, catalog):
+        """Index new and changed gene files of the catalog and drop removed ones."""
+        with self._update_lock:
+            self._update(catalog)
+
+    def _update(self, catalog):
+        current = set()
+        for dataset in catalog.datasets():
+            for gene in catalog.genes(dataset):
+                entry = catalog.gene(dataset, gene)
+                signature = (entry.path, entry.size, entry.mtime)
+                current.add((dataset, gene))
+                indexed = self._files.get((dataset, gene))
+                if indexed is not None and indexed[0] == signature:
+                    continue
+                source = gene_source(os.path.join(catalog.data_dir, dataset, gene))
+                if source is None:
+                    continue
+                # Read outside the lock so searches are not blocked while parsing
+                hits = read_hits(dataset, gene, source[1]())
+                with self._lock:
+                    self._remove((dataset, gene))
+                    self._add((dataset, gene), signature, hits)
+        with self._lock:
+            for name in set(self._files) - current:
+                self._remove(name)
+            self._keys = sorted(self._postings)
+
+    def _add(self, name, signature, hits):
+        ids = []
+        for hit, keys in hits:
+            hit_id = self._next_id
+            self._next_id += 1
+            self._hits[hit_id] = hit
+            for key in keys:
+                self._postings.setdefault(key, set()).add(hit_id)
+            ids.append((hit_id, keys))
+        self._files[name] = (signature, ids)
+
+    def _remove(self, name):
+        indexed = self._files.pop(name, None)
+        if indexed is None:
+            return
+        for hit_id, keys in indexed[1]:
+            del self._hits[hit_id]
+            for key in keys:
+                postings = self._postings[key]
+                postings.discard(hit_id)
+                if not postings:
+                    del self._postings[key]
+
+    def _prefix(self, term):
+        # Hit ids of every key starting with term
+        start = bisect.bisect_left(self._keys, term)
+        end = bisect.bisect_left(self._keys, term + "\uffff")
+        ids = set()
+        for key in self._keys[start:end]:
+            ids |= self._postings.get(key, set())
+        return ids
+
+    def search(self, query, limit=50):
+        """Return (number of matches, first limit SearchHits) for a query, sorted by gene, AA and dataset."""
+        terms = [normalize(term) for term in query.split() if term.strip()]
+        if not terms:
+            return 0, []
+        with self._lock:
+            ids = None
+            for term in terms:
+                matches = self._prefix(term)
+                ids = matches if ids is None else ids & matches
+                if not ids:
+                    return 0, []
+            hits = [self._hits[hit_id] for hit_id in ids]
+        hits.sort(key=lambda hit: (hit.gene, hit.AA, hit.variant, hit.dataset))
+        return len(hits), hits[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._files), "variants": len(self._hits), "keys": len(self._postings)}
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app modules live at the top of the repository and the preprocessing scripts in
+# data_preprocessing/; neither is an installed package
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "data_preprocessing")]
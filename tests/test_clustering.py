@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from clustering import cluster_variants
+from gene_tables import read_gene_table
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def loop_clusters(variants, cohort, cluster_distance=10):
+    # The per-row loop update_plot used before cluster_variants, returning the clusters
+    # with carriers as (start, end, exon, x, size, label)
+    grouped_variants = []
+    cluster = [variants.iloc[0]] if not variants.empty else []
+    for i in range(1, len(variants)):
+        current = variants.iloc[i]
+        previous = cluster[-1]
+        same_exon = current["exon"] == previous["exon"]
+        close_by = abs(current["AA"] - previous["AA"]) <= cluster_distance
+        if same_exon and close_by:
+            cluster.append(current)
+        else:
+            grouped_variants.append(cluster)
+            cluster = [current]
+    if cluster:
+        grouped_variants.append(cluster)
+    het_col = f"{cohort}.Het"
+    hom_col = f"{cohort}.Hom_A1"
+    clusters = []
+    for cluster in grouped_variants:
+        if not any((v.get(hom_col, 0) + v.get(het_col, 0)) > 0 for v in cluster):
+            continue
+        x = sum(v["AA"] for v in cluster) / len(cluster)
+        label = "\n".join([
+            f"{v['variant']} ({v.get(hom_col, 0)} / {v.get(het_col, 0)})"
+            for v in cluster
+            if (v.get(hom_col, 0) + v.get(het_col, 0)) > 0
+        ])
+        clusters.append((cluster[0]["AA"], cluster[-1]["AA"], cluster[0]["exon"], x, len(cluster), label))
+    return clusters
+
+
+def vectorized_clusters(variants, cohort, cluster_distance=10):
+    clusters = cluster_variants(variants, cohort, cluster_distance)
+    clusters = clusters[clusters["carriers"] > 0]
+    return list(zip(clusters["start"], clusters["end"], clusters["exon"], clusters["x"], clusters["size"], clusters["label"]))
+
+
+def synthetic_variants(n, seed):
+    # AA-sorted variants with dense and sparse stretches, exon changes and mostly zero counts
+    rng = np.random.default_rng(seed)
+    aa = np.sort(rng.integers(1, 400, n))
+    return pd.DataFrame({
+        "variant": [f"V{i}" for i in range(n)],
+        "AA": aa,
+        "exon": 1 + aa // 60,
+        "ad.Hom_A1": np.where(rng.random(n) < 0.1, rng.integers(1, 3, n), 0),
+        "ad.Het": np.where(rng.random(n) < 0.4, rng.integers(1, 20, n), 0),
+    })
+
+
+def gene_files():
+    data_dir = os.path.join(ROOT, "data")
+    if not os.path.isdir(data_dir):
+        return []
+    return sorted(
+        os.path.join(data_dir, dataset, gene)
+        for dataset in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, dataset))
+        for gene in os.listdir(os.path.join(data_dir, dataset))
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("cluster_distance", [0, 3, 10, 50])
+def test_synthetic_matches_loop(seed, cluster_distance):
+    variants = synthetic_variants(300, seed)
+    assert vectorized_clusters(variants, "ad", cluster_distance) == loop_clusters(variants, "ad", cluster_distance)
+
+
+def test_missing_cohort_has_no_carriers():
+    variants = synthetic_variants(50, 0)
+    assert vectorized_clusters(variants, "healthy") == loop_clusters(variants, "healthy") == []
+
+
+def test_empty_table():
+    clusters = cluster_variants(synthetic_variants(0, 0), "ad")
+    assert clusters.empty
+
+
+@pytest.mark.parametrize("file_path", gene_files(), ids=lambda path: os.path.relpath(path, ROOT))
+def test_gene_files_match_loop(file_path):
+    variants = read_gene_table(file_path).variants
+    cohorts = [col[:-len(".Het")] for col in variants.columns if col.endswith(".Het")]
+    for cohort in cohorts:
+        assert vectorized_clusters(variants, cohort) == loop_clusters(variants, cohort)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from count_genotypes import BED_MAGIC, HET, HOM_A1, HOM_A2, MISSING, count_genotypes, membership_matrix
+
+
+def write_bed(path, codes):
+    # SNP-major .bed file of a (variants, samples) array of 2-bit genotype codes, four
+    # samples per byte with the first sample in the lowest bits
+    n_variants, n_samples = codes.shape
+    padded = np.full((n_variants, (n_samples + 3) // 4 * 4), MISSING, dtype=np.uint8)
+    padded[:, :n_samples] = codes
+    quads = padded.reshape(n_variants, -1, 4)
+    packed = quads[:, :, 0] | quads[:, :, 1] << 2 | quads[:, :, 2] << 4 | quads[:, :, 3] << 6
+    with open(path, "wb") as f:
+        f.write(BED_MAGIC + packed.astype(np.uint8).tobytes())
+
+
+def expected_counts(codes, groups):
+    # (variants, groups, 3) Hom_A1/Het/Hom_A2 counts, one sample at a time
+    counts = np.zeros((codes.shape[0], len(groups), 3), dtype=np.int64)
+    for j, members in enumerate(groups):
+        for sample in members:
+            for k, code in enumerate((HOM_A1, HET, HOM_A2)):
+                counts[:, j, k] += codes[:, sample] == code
+    return counts
+
+
+@pytest.mark.parametrize("n_samples", [1, 4, 7, 30])
+def test_bed_round_trip(tmp_path, n_samples):
+    rng = np.random.default_rng(n_samples)
+    n_variants = 25
+    codes = rng.integers(0, 4, (n_variants, n_samples)).astype(np.uint8)
+    bed_path = str(tmp_path / "test.bed")
+    write_bed(bed_path, codes)
+
+    sample_ids = [f"S{i}" for i in range(n_samples)]
+    cohorts = [("even", set(sample_ids[::2])), ("odd", set(sample_ids[1::2]))]
+    membership = membership_matrix(sample_ids, cohorts)
+    groups = [range(n_samples), range(0, n_samples, 2), range(1, n_samples, 2)]
+    expected = expected_counts(codes, groups)
+
+    assert np.array_equal(count_genotypes(bed_path, n_variants, membership), expected)
+    # Blocks of a few variants and a sub-range, as used by the parallel counting stage
+    assert np.array_equal(count_genotypes(bed_path, n_variants, membership, block_bytes=16), expected)
+    assert np.array_equal(count_genotypes(bed_path, n_variants, membership, variant_range=(5, 17)), expected[5:17])
+
+
+def test_rejects_wrong_size(tmp_path):
+    bed_path = str(tmp_path / "test.bed")
+    write_bed(bed_path, np.zeros((3, 5), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        count_genotypes(bed_path, 4, membership_matrix([f"S{i}" for i in range(5)], []))
@@ -0,0 +1,161 @@
+"""Per-session store of uploaded gene files.
+
+Uploads arrive as base64 data URLs from ``dcc.Upload``. They are decoded in
+chunks (rejecting files over the size limit before decoding anything), parsed
+and validated once, and kept in memory as GeneTables. Entries are private to the
+browser session that uploaded them and are addressed by a handle derived from
+the file contents (``upload:<sha256>``) instead of a path, so nothing is written
+under ``data/`` and two users uploading files with the same name never collide.
+
+The store has a total memory budget (least recently used uploads are dropped
+first) and uploads that have not been used for ttl seconds expire.
+"""
+
+import base64
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import metrics
+from catalog import header_cohorts
+from gene_tables import prepare_gene_table
+
+
+HANDLE_PREFIX = "upload:"
+
+# Columns an uploaded gene file must have, besides at least one <cohort>.Het column
+REQUIRED_COLUMNS = ("variant", "AA", "exon")
+
+# An uploaded gene file: its parsed table, original file name and cohorts
+Upload = namedtuple("Upload", ["handle", "table", "name", "cohorts"])
+
+
+class UploadError(ValueError):
+    """Raised for uploads that are too large or are not valid gene files."""
+
+
+def is_upload_handle(value):
+    return isinstance(value, str) and value.startswith(HANDLE_PREFIX)
+
+
+def decode_upload(contents, max_bytes, chunk_chars=1 << 20):
+    """Decode a base64 data URL into a file object, returning (file, sha256 hex)."""
+    header, sep, data = contents.partition(",")
+    if not sep or not header.endswith(";base64"):
+        raise UploadError("The upload is not a base64 encoded file.")
+    # Every 4 base64 characters hold 3 bytes, so the size is known before decoding
+    size = len(data) // 4 * 3 - data[-2:].count("=")
+    if size > max_bytes:
+        raise UploadError(f"The file is {size / 2**20:.1f} MB, the limit is {max_bytes / 2**20:.1f} MB.")
+    out = io.BytesIO()
+    digest = hashlib.sha256()
+    # chunk_chars is a multiple of 4, so every chunk decodes on its own
+    chunk_chars -= chunk_chars % 4
+    try:
+        for start in range(0, len(data), chunk_chars):
+            block = base64.b64decode(data[start:start + chunk_chars], validate=True)
+            digest.update(block)
+            out.write(block)
+    except ValueError:
+        raise UploadError("The upload is not a valid base64 encoded file.")
+    out.seek(0)
+    return out, digest.hexdigest()
+
+
+def parse_upload(contents, filename, max_bytes):
+    """Decode and validate an uploaded gene file and return it as an Upload."""
+    import pandas as pd
+    with metrics.phase("decode"):
+        raw, digest = decode_upload(contents, max_bytes)
+    try:
+        with metrics.phase("parse"):
+            variants = pd.read_csv(raw, sep="\t")
+    except (ValueError, UnicodeDecodeError, pd.errors.ParserError) as e:
+        raise UploadError(f"{filename} is not a tab-delimited gene file ({e}).")
+    missing = [col for col in REQUIRED_COLUMNS if col not in variants.columns]
+    if missing:
+        raise UploadError(f"{filename} is missing the column(s) {', '.join(missing)}.")
+    cohorts = header_cohorts(variants.columns)
+    if not cohorts:
+        raise UploadError(f"{filename} has no <cohort>.Het count columns.")
+    with metrics.phase("parse"):
+        table = prepare_gene_table(variants, digest)
+    if table.variants.empty:
+        raise UploadError(f"{filename} has no variants with an amino acid position.")
+    return Upload(HANDLE_PREFIX + digest, table, filename, cohorts)
+
+
+class UploadStore:
+    """In-memory uploads of every session with a byte budget and expiry.
+
+    Uploads are keyed by (session id, handle). Uploads larger than the whole
+    budget are rejected.
+    """
+
+    def __init__(self, max_bytes, ttl, max_file_bytes):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_file_bytes = max_file_bytes
+        self.evictions = 0
+        self.expirations = 0
+        # (session, handle) -> (last use, Upload), least recently used first
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def add(self, session, contents, filename):
+        """Parse an upload and store it for session; raises UploadError if it is invalid."""
+        upload = parse_upload(contents, filename, self.max_file_bytes)
+        nbytes = upload.table.nbytes
+        if nbytes > self.max_bytes:
+            raise UploadError(f"{filename} is too large to keep in memory.")
+        key = (session, upload.handle)
+        with self._lock:
+            self._expire(time.monotonic())
+            self._remove(key)
+            self._entries[key] = (time.monotonic(), upload)
+            self._size += nbytes
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted.table.nbytes
+                self.evictions += 1
+        return upload
+
+    def get(self, session, handle):
+        """Return the Upload for handle in session, or None if it expired or was evicted."""
+        key = (session, handle)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries[key] = (now, entry[1])
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1].table.nbytes
+
+    def _expire(self, now):
+        # Entries are ordered by last use, so expired ones are at the front
+        while self._entries:
+            key, (last_used, _) = next(iter(self._entries.items()))
+            if now - last_used < self.ttl:
+                break
+            self._remove(key)
+            self.expirations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,108 @@
+"""AA-position index of the variants of a gene, used by the JSON API.
+
+The index is built from the same parsed GeneTable the plots are drawn from, so
+the API and the plots always agree. Variants are already sorted by AA position,
+so a range lookup is a binary search for each end of the range followed by a
+slice: O(log n + k) for k matching variants. Each exon also has its own sorted
+positions for lookups restricted to one exon.
+
+numpy and pandas are imported on first use, so that importing the app does not
+load them.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class VariantIndex:
+    """Sorted AA positions of one gene table, overall and per exon."""
+
+    def __init__(self, table):
+        import numpy as np
+        self.variants = table.variants
+        self._carriers = {}
+        self.aa = table.variants["AA"].to_numpy(dtype=float)
+        exons = table.variants["exon"].astype(str).to_numpy()
+        # Rows of each exon, in AA order (a stable sort keeps the AA order within an exon)
+        order = np.argsort(exons, kind="stable")
+        boundaries = np.flatnonzero(exons[order][1:] != exons[order][:-1]) + 1
+        self.exons = {}
+        for rows in np.split(order, boundaries):
+            if len(rows):
+                self.exons[exons[rows[0]]] = (self.aa[rows], rows)
+
+    def query(self, aa_start=None, aa_end=None, exon=None):
+        """Return the row numbers of the variants with aa_start <= AA <= aa_end, in AA order."""
+        import numpy as np
+        if exon is None:
+            aa, rows = self.aa, None
+        elif str(exon) in self.exons:
+            aa, rows = self.exons[str(exon)]
+        else:
+            return np.empty(0, dtype=int)
+        first = 0 if aa_start is None else np.searchsorted(aa, aa_start, side="left")
+        last = len(aa) if aa_end is None else np.searchsorted(aa, aa_end, side="right")
+        if rows is None:
+            return np.arange(first, last)
+        return rows[first:last]
+
+    def carriers(self, cohort):
+        """Return the number of carriers in cohort of every variant (computed once per cohort)."""
+        carriers = self._carriers.get(cohort)
+        if carriers is None:
+            carriers = counts(self.variants, f"{cohort}.Hom_A1") + counts(self.variants, f"{cohort}.Het")
+            self._carriers[cohort] = carriers
+        return carriers
+
+    def records(self, rows, cohort):
+        """Return the variants at rows as JSON-serialisable dicts with the counts of one cohort."""
+        subset = self.variants.iloc[rows]
+        hom = counts(subset, f"{cohort}.Hom_A1")
+        het = counts(subset, f"{cohort}.Het")
+        genes = subset["Gene.refGene"].astype(str) if "Gene.refGene" in subset else [None] * len(subset)
+        return [
+            {
+                "gene": gene,
+                "variant": variant,
+                "AA": int(aa),
+                "exon": str(exon),
+                "Hom_A1": int(h),
+                "Het": int(t),
+                "carriers": int(h + t),
+            }
+            for gene, variant, aa, exon, h, t in zip(
+                genes, subset["variant"].astype(str), subset["AA"], subset["exon"], hom, het
+            )
+        ]
+
+
+def counts(variants, column):
+    # Missing cohorts and missing counts are zero, as on the plots
+    import numpy as np
+    import pandas as pd
+    if column not in variants:
+        return np.zeros(len(variants), dtype=np.int64)
+    return pd.to_numeric(variants[column], errors="coerce").fillna(0).to_numpy(dtype=np.int64)
+
+
+class VariantIndexCache:
+    """Indexes of the most recently queried gene tables, keyed by their content hash."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, table):
+        with self._lock:
+            index = self._entries.get(table.digest)
+            if index is not None:
+                self._entries.move_to_end(table.digest)
+                return index
+        index = VariantIndex(table)
+        with self._lock:
+            self._entries[table.digest] = index
+            self._entries.move_to_end(table.digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index